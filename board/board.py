@@ -1,12 +1,87 @@
 import chess
+from chess.polyglot import POLYGLOT_RANDOM_ARRAY, zobrist_hash
+from engine.piece_maps import PST, COLOR_STRIDE, PIECE_STRIDE, PHASE_STRIDE, ENDGAME, PHASE_WEIGHTS
+
+# polyglot key layout: 12 * 64 piece keys, 4 castling keys, 8 en passant files, 1 turn key
+CASTLING_KEY_INDEX = 768
+EP_KEY_INDEX = 772
+TURN_KEY = POLYGLOT_RANDOM_ARRAY[780]
+
+
+# PIECE_KEYS[color][piece_type][square]
+PIECE_KEYS = tuple(
+    (None,) + tuple(tuple(POLYGLOT_RANDOM_ARRAY[64 * ((piece_type - 1) * 2 + color) + square] for square in chess.SQUARES)
+                    for piece_type in chess.PIECE_TYPES)
+    for color in (chess.BLACK, chess.WHITE)
+)
+
+
+EG_OFFSET = ENDGAME * PHASE_STRIDE
+
+
+def castling_key(board):
+    rights = board.clean_castling_rights()
+    key = 0
+    if rights & chess.BB_H1:
+        key ^= POLYGLOT_RANDOM_ARRAY[CASTLING_KEY_INDEX]
+    if rights & chess.BB_A1:
+        key ^= POLYGLOT_RANDOM_ARRAY[CASTLING_KEY_INDEX + 1]
+    if rights & chess.BB_H8:
+        key ^= POLYGLOT_RANDOM_ARRAY[CASTLING_KEY_INDEX + 2]
+    if rights & chess.BB_A8:
+        key ^= POLYGLOT_RANDOM_ARRAY[CASTLING_KEY_INDEX + 3]
+    return key
+
+
+def ep_key(board):
+    # same rule as polyglot: only hashed when a pawn is ready to capture
+    ep_square = board.ep_square
+    if ep_square:
+        if board.turn == chess.WHITE:
+            ep_mask = chess.shift_down(chess.BB_SQUARES[ep_square])
+        else:
+            ep_mask = chess.shift_up(chess.BB_SQUARES[ep_square])
+        ep_mask = chess.shift_left(ep_mask) | chess.shift_right(ep_mask)
+        if ep_mask & board.pawns & board.occupied_co[board.turn]:
+            return POLYGLOT_RANDOM_ARRAY[EP_KEY_INDEX + chess.square_file(ep_square)]
+    return 0
+
 
 class ChessBoard:
     def __init__(self):
         self.board = chess.Board()
+        # polyglot zobrist key of the current position, updated on push/pop
+        self.hash = 0
+        self._castling_rights = 0
+        self._castling_key = 0
+        self._ep_key = 0
+        # middlegame and endgame evaluation sums, updated on push/pop
+        self.mg_eval = 0
+        self.eg_eval = 0
+        self.phase = 0
+        self._stack = []
+        self._refresh()
+
+    def _refresh(self):
+        board = self.board
+        self.hash = zobrist_hash(board)
+        self._castling_rights = board.castling_rights
+        self._castling_key = castling_key(board)
+        self._ep_key = ep_key(board)
+        self.mg_eval = 0
+        self.eg_eval = 0
+        self.phase = 0
+        for square, piece in board.piece_map().items():
+            index = piece.color * COLOR_STRIDE + piece.piece_type * PIECE_STRIDE + square
+            self.mg_eval += PST[index]
+            self.eg_eval += PST[index + EG_OFFSET]
+            self.phase += PHASE_WEIGHTS[piece.piece_type]
+        self._stack = []
 
     # Tout cela n'est pas forcément utile, la libraire a tout
     def set_fen(self, fen):
-        self.board.set_fen(fen) 
+        self.board.set_fen(fen)
+        self._refresh()
 
     def get_fen(self):
         return self.board.fen()
@@ -15,10 +90,70 @@ class ChessBoard:
         return list(self.board.legal_moves)
 
     def push(self, move):
-        self.board.push(move)
+        board = self.board
+        self._stack.append((self.hash, self._castling_rights, self._castling_key, self._ep_key,
+                            self.mg_eval, self.eg_eval, self.phase))
+        key = self.hash ^ self._castling_key ^ self._ep_key ^ TURN_KEY
+
+        if move:
+            us = board.turn
+            from_square = move.from_square
+            to_square = move.to_square
+            piece_type = board.piece_type_at(from_square)
+            captured = board.piece_type_at(to_square)
+            placed = move.promotion or piece_type
+            our_keys = PIECE_KEYS[us]
+            us_offset = us * COLOR_STRIDE
+            them_offset = COLOR_STRIDE - us_offset
+
+            key ^= our_keys[piece_type][from_square] ^ our_keys[placed][to_square]
+            from_index = us_offset + piece_type * PIECE_STRIDE + from_square
+            to_index = us_offset + placed * PIECE_STRIDE + to_square
+            mg = PST[to_index] - PST[from_index]
+            eg = PST[to_index + EG_OFFSET] - PST[from_index + EG_OFFSET]
+            if captured:
+                key ^= PIECE_KEYS[not us][captured][to_square]
+                captured_index = them_offset + captured * PIECE_STRIDE + to_square
+                mg -= PST[captured_index]
+                eg -= PST[captured_index + EG_OFFSET]
+                self.phase -= PHASE_WEIGHTS[captured]
+            elif piece_type == chess.PAWN and to_square == board.ep_square:
+                captured_square = to_square - 8 if us else to_square + 8
+                key ^= PIECE_KEYS[not us][chess.PAWN][captured_square]
+                captured_index = them_offset + chess.PAWN * PIECE_STRIDE + captured_square
+                mg -= PST[captured_index]
+                eg -= PST[captured_index + EG_OFFSET]
+            elif piece_type == chess.KING and abs(to_square - from_square) == 2:
+                if to_square > from_square:
+                    rook_from, rook_to = to_square + 1, to_square - 1
+                else:
+                    rook_from, rook_to = to_square - 2, to_square + 1
+                key ^= our_keys[chess.ROOK][rook_from] ^ our_keys[chess.ROOK][rook_to]
+                rook_index = us_offset + chess.ROOK * PIECE_STRIDE
+                mg += PST[rook_index + rook_to] - PST[rook_index + rook_from]
+                eg += PST[rook_index + rook_to + EG_OFFSET] - PST[rook_index + rook_from + EG_OFFSET]
+            if move.promotion:
+                self.phase += PHASE_WEIGHTS[placed]
+            self.mg_eval += mg
+            self.eg_eval += eg
+
+        board.push(move)
+
+        if board.castling_rights != self._castling_rights:
+            self._castling_rights = board.castling_rights
+            self._castling_key = castling_key(board)
+        self._ep_key = ep_key(board) if board.ep_square is not None else 0
+        self.hash = key ^ self._castling_key ^ self._ep_key
 
     def pop(self):
-        self.board.pop()
+        (self.hash, self._castling_rights, self._castling_key, self._ep_key,
+         self.mg_eval, self.eg_eval, self.phase) = self._stack.pop()
+        return self.board.pop()
+
+    def hash_history(self, plies=None):
+        # keys of the positions before the current one, oldest first
+        history = self._stack if plies is None else self._stack[max(0, len(self._stack) - plies):] if plies else []
+        return [entry[0] for entry in history]
 
     def is_legal(self, move):
         return self.board.is_legal(move)
@@ -26,7 +161,7 @@ class ChessBoard:
     def uci_move(self, move_uci):
         move = chess.Move.from_uci(move_uci)
         if move in self.board.legal_moves:
-            self.board.push(move)
+            self.push(move)
             return True
         return False
 
@@ -36,6 +171,7 @@ class ChessBoard:
 
     def reset(self):
         self.board.set_fen(chess.STARTING_FEN)
+        self._refresh()
 
 
 
@@ -0,0 +1,83 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from board.board import ChessBoard
+from engine.minimax import MinimaxEngine, DEFAULT_DEPTH
+from engine.options import DEFAULT_TT_SIZE_MB
+
+# score is in centipawns from the side to move, time in seconds,
+# iterations lists (time, depth, move) for every completed iteration when asked for, else None
+AnalysisResult = namedtuple("AnalysisResult", ["index", "fen", "best_move", "score", "depth", "nodes", "time",
+                                               "iterations"], defaults=(None,))
+
+TASKS_PER_WORKER = 4  # positions queued ahead per worker, the input is read lazily
+
+# engine of a worker process, reused for every position it gets
+_analysis_engine = None
+
+
+def _init_analysis_worker(engine_options):
+    global _analysis_engine
+    _analysis_engine = MinimaxEngine(ChessBoard(), **engine_options)
+
+
+def _analyze_position(index, fen, depth, time_limit, record_iterations=False, clear_tables=False):
+    # the transposition table is kept between positions unless clear_tables is set,
+    # related positions (same game, same opening) reuse it
+    engine = _analysis_engine
+    engine.board.set_fen(fen)
+    if clear_tables:
+        engine.reset_engine()
+    engine.opening = False
+    engine.depth = depth
+    engine.time_limit = time_limit
+
+    iterations = None
+    if record_iterations:
+        iterations = []
+        def record_iteration(info):
+            if "depth" in info:
+                iterations.append((info["time"], info["depth"], info["pv"][0].uci()))
+        engine.info_callback = record_iteration
+    start_time = time.time()
+    best_move = engine.make_move()
+    elapsed = time.time() - start_time
+    engine.info_callback = None
+    return AnalysisResult(index, fen, best_move.uci() if best_move else None, engine.score, engine.depth_reached,
+                          engine.nodes_searched, elapsed, iterations)
+
+
+def analyze_many(fens, depth: int = None, movetime: int = None, workers: int = None, engine_type: int = 0,
+                 tt_size_mb: int = DEFAULT_TT_SIZE_MB, engine_options: dict = None, record_iterations: bool = False,
+                 clear_tables: bool = False):
+    # analyzes every fen to a fixed depth or for movetime milliseconds (like "go movetime"),
+    # yields an AnalysisResult per position in the order they finish.
+    # engine_options are extra MinimaxEngine keyword arguments, clear_tables makes every result independent
+    # of the positions its worker analyzed before
+    depth = depth if depth is not None else DEFAULT_DEPTH
+    engine_options = {**dict(depth=depth, engine_type=engine_type, tt_size_mb=tt_size_mb), **(engine_options or {})}
+    time_limit = movetime / 1000.0 if movetime is not None else None
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        _init_analysis_worker(engine_options)
+        for index, fen in enumerate(fens):
+            yield _analyze_position(index, fen, depth, time_limit, record_iterations, clear_tables)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_analysis_worker,
+                             initargs=(engine_options,)) as pool:
+        positions = enumerate(fens)
+        pending = set()
+        while True:
+            for index, fen in positions:
+                pending.add(pool.submit(_analyze_position, index, fen, depth, time_limit, record_iterations,
+                                        clear_tables))
+                if len(pending) >= workers * TASKS_PER_WORKER:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
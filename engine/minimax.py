@@ -1,29 +1,48 @@
-import math
 from board.board import ChessBoard
-from engine.opening_moves_from_book import Book_opening
-from engine.piece_maps import Piece_map
-from engine.transposition import TranspositionTable
+from engine.opening_moves_from_book import shared_book
+from engine.piece_maps import Piece_values, TOTAL_PHASE
+from engine.transposition import TranspositionTable, EXACT, LOWER, UPPER
+from engine.options import DEFAULT_TT_SIZE_MB, MIN_THREADS, MAX_THREADS, MIN_ROOT_SPLIT, MAX_ROOT_SPLIT
 from engine.move_ordering import MoveOrder
 from engine.repetition import RepetitionTable
+from engine.smp import LazySMP
+from engine.parallel import RootSplit, ROOT_SPLIT_MIN_DEPTH
 import chess
 import time
-import sys
 
-Piece_values = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 20000}
 MATE_SCORE = 999999
 MAX_DEPTH = 32
+MAX_PLY = 128
 DEFAULT_DEPTH = 4
 NODE_TIME_CHECK = 2048
-MAX_TT_SIZE_MB = 64
+INFINITY = MATE_SCORE + 1
+MATE_THRESHOLD = MATE_SCORE - 1000
+ASPIRATION_WINDOW = 50
+ASPIRATION_MIN_DEPTH = 3
+DELTA_MARGIN = 200
+NULL_MOVE_MIN_DEPTH = 3
+REVERSE_FUTILITY_DEPTH = 3
+REVERSE_FUTILITY_MARGIN = 120  # per ply of depth
+FUTILITY_MARGINS = (0, 200, 350)  # indexed by depth at frontier nodes
+LMR_MIN_DEPTH = 3
+LMR_MIN_MOVES = 3
+INFO_INTERVAL = 1.0  # seconds between progress reports inside an iteration
 TIME_ABORT = object()
 
 class MinimaxEngine:
-    def __init__(self, board: ChessBoard, depth: int=DEFAULT_DEPTH, time_limit: float=None, engine_type: int=0, move_ordering: bool=True, iterative_deepening: bool=True, quiescence: bool = True, opening: bool=True):
+    def __init__(self, board: ChessBoard, depth: int=DEFAULT_DEPTH, time_limit: float=None, engine_type: int=0, move_ordering: bool=True, iterative_deepening: bool=True, quiescence: bool = True, opening: bool=True, tt_size_mb: int=DEFAULT_TT_SIZE_MB, null_move: bool=True, late_move_reductions: bool=True, futility_pruning: bool=True, tt_buffer=None):
         self.board = board
 
         self.engine_type = engine_type
+        # 0: alpha-beta with transposition table, 1: alpha-beta, 2: plain minimax
+        self.use_tt = engine_type == 0
+        self.use_pruning = engine_type in (0, 1)
         self.quiescence = quiescence
         self.iterative_deepening = iterative_deepening
+        # selective search, only used by the alpha-beta variants
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
+        self.futility_pruning = futility_pruning
 
         self.depth = depth
         self.original_depth = depth
@@ -35,44 +54,50 @@ class MinimaxEngine:
         self.transpositions_used = 0
 
         self.order_moves = move_ordering
-        self.ending = False
         self.opening = True
 
-        self.pv_move = None
+        # principal variation of the last completed iteration, and the triangular table building it
+        self.pv = []
+        self.pv_table = [[] for _ in range(MAX_PLY)]
+        self.follow_pv = False
         self.time_limit = time_limit
         self.start_time = None
+        # absolute wall-clock time to stop at, set from outside while searching (uci ponderhit)
+        self.deadline = None
         self.stop_search = False
-
-        self.book_opening = Book_opening()
-        self.ttable = TranspositionTable()
+        # set by another process to end the search (lazy smp helpers)
+        self.stop_event = None
+        self.start_depth = 1
+
+        # result of the last search: score from the side to move and last fully searched depth
+        self.score = None
+        self.depth_reached = 0
+        # called with a dict (depth, score, mate, nodes, time, hashfull, pv) after every completed iteration,
+        # and with (nodes, time, hashfull) every INFO_INTERVAL while an iteration runs
+        self.info_callback = None
+        self.last_info_time = None
+
+        # lazy smp helper processes, created by set_threads
+        self.threads = 1
+        self.smp = None
+        # pool splitting the root moves between processes, created by set_root_split
+        self.root_split = None
+
+        self.book_opening = None  # the process-wide book, fetched on the first book lookup
+        # tt_buffer attaches to a table that lives in shared memory (lazy smp helpers)
+        self.ttable = TranspositionTable(tt_size_mb, buffer=tt_buffer, attach=tt_buffer is not None)
         self.repetition_table = RepetitionTable()
 
         self.move_order = MoveOrder()
 
-        self.maps = {}
-        for piece_type in Piece_values:
-            self.maps[piece_type] = {}  # first level: piece_type
-            self.maps[piece_type][chess.WHITE] = {}  # second level: color
-            self.maps[piece_type][chess.BLACK] = {}  # second level: color
-
-            # White
-            self.maps[piece_type][chess.WHITE][False] = Piece_map()
-            self.maps[piece_type][chess.WHITE][False].gen_map(piece_type, False, chess.WHITE)
-            self.maps[piece_type][chess.WHITE][True] = Piece_map()
-            self.maps[piece_type][chess.WHITE][True].gen_map(piece_type, True, chess.WHITE)
-
-            # Black
-            self.maps[piece_type][chess.BLACK][False] = Piece_map()
-            self.maps[piece_type][chess.BLACK][False].gen_map(piece_type, False, chess.BLACK)
-            self.maps[piece_type][chess.BLACK][True] = Piece_map()
-            self.maps[piece_type][chess.BLACK][True].gen_map(piece_type, True, chess.BLACK)
-
         self.debug = False         # turn on to record search tree
         self._tree_lines = []      # collected debug lines
 
 
     def make_move(self):
         if self.opening:
+            if self.book_opening is None:
+                self.book_opening = shared_book()
             opening_move_choice = self.book_opening.opening_move(self.board)
             if opening_move_choice is None:
                 self.opening = False
@@ -85,95 +110,132 @@ class MinimaxEngine:
         self.transpositions_found = 0
         self.transpositions_used = 0
         self.stop_search = False
-
-        board = self.board.board
-        non_pawn_mask = (
-                board.pieces(chess.KNIGHT, chess.WHITE) |
-                board.pieces(chess.BISHOP, chess.WHITE) |
-                board.pieces(chess.ROOK, chess.WHITE) |
-                board.pieces(chess.QUEEN, chess.WHITE) |
-                board.pieces(chess.KNIGHT, chess.BLACK) |
-                board.pieces(chess.BISHOP, chess.BLACK) |
-                board.pieces(chess.ROOK, chess.BLACK) |
-                board.pieces(chess.QUEEN, chess.BLACK)
-        )
-        non_pawn_pieces = bin(non_pawn_mask).count("1")
-
-        if non_pawn_pieces <= 1:
-            self.ending = True
-            self.depth = self.original_depth + 4
-        elif non_pawn_pieces <= 2:
-            self.ending = True
-            self.depth = self.original_depth + 2
-        elif non_pawn_pieces <= 5:
-            self.ending = True
-            self.depth = self.original_depth + 1
+        self.pv = []
+        self.score = None
+        self.depth_reached = 0
 
         #iterative deepening and PV
         best_move = None
-        best_eval = -math.inf if self.board.board.turn else math.inf
+        best_eval = -INFINITY
         self.start_time = time.time()
+        self.last_info_time = self.start_time
 
-        #clear repetition table
-        self.repetition_table.positions.clear()
-        self.repetition_table.add_position(self.board.board)
+        #seed repetition history with the game positions since the last irreversible move
+        self.repetition_table.seed(self.board.hash_history(self.board.board.halfmove_clock), self.board.hash)
 
-        #clear transposition table
-        #if len(self.ttable.table)>=100000:
-        if self.tt_too_large():
-            self.ttable.table.clear()
+        #age transposition table, stale entries are replaced first
+        self.ttable.new_search()
 
-        #clear killer moves table
-        #self.move_order.clear_killer_moves()
+        #killers are stored by ply so they don't carry over to the next position, history fades
+        self.move_order.clear_killer_moves()
+        self.move_order.age_history()
 
         if self.time_limit is not None:  # if limit exists, bot should think as much as possible
             self.depth = max(self.depth, MAX_DEPTH)
 
+        #helpers search the same position in the background and fill the shared table
+        if self.smp is not None:
+            self.smp.start_search()
+        if self.root_split is not None and self.smp is None:
+            self.root_split.new_search()
+
         if self.iterative_deepening:
 
-            for current_depth in range(1, self.depth+1):
+            for current_depth in range(min(self.start_depth, self.depth), self.depth+1):
 
                 if self._time_exceeded() or self.stop_search:
                     break
 
                 self.call_depth = current_depth
-                eval, move = None, None
-
-                #eval,move = self._minimax(self.depth, self.board.board.turn)
-                #eval, move = self._minimax_pruning(current_depth, -math.inf, math.inf, self.board.board.turn)
-                #eval, move = self._minimax_pruning_tt(current_depth, -math.inf, math.inf, self.board.board.turn)
-                if self.engine_type == 0:
-                    eval, move = self._minimax_pruning_tt(current_depth, -math.inf, math.inf, self.board.board.turn)
-                elif self.engine_type == 1:
-                    eval, move = self._minimax_pruning(current_depth, -math.inf, math.inf, self.board.board.turn)
-                elif self.engine_type == 2:
-                    eval, move = self._minimax(current_depth, self.board.board.turn)
+                previous_eval = best_eval if best_move is not None else None
+                if (self.root_split is not None and self.smp is None and current_depth > ROOT_SPLIT_MIN_DEPTH
+                        and best_move is not None):
+                    eval, move = self._root_split_search(current_depth, previous_eval, best_move)
+                else:
+                    eval, move = self._aspiration_search(current_depth, previous_eval)
 
                 #if self.stop_search:
                     #break #normalement pas mais evaluation imprécise
 
-
                 if move is not None:
                     best_eval = eval
                     best_move = move
                     #print(move)
-                    self.pv_move = move
-
+                    self._update_pv(move)
+                    if not self.stop_search:
+                        self.depth_reached = current_depth
+                        if self.info_callback is not None:
+                            self._report_iteration(current_depth, eval)
 
         else:
-            if self.engine_type == 0:
-                eval, best_move = self._minimax_pruning_tt(self.depth, -math.inf, math.inf, self.board.board.turn)
-            elif self.engine_type == 1:
-                eval, best_move = self._minimax_pruning(self.depth, -math.inf, math.inf, self.board.board.turn)
-            elif self.engine_type == 2:
-                eval, best_move = self._minimax(self.depth, self.board.board.turn)
-
+            self.call_depth = self.depth
+            best_eval, best_move = self._negamax(self.depth, -INFINITY, INFINITY, 0)
+            if best_move is not None:
+                self._update_pv(best_move)
+                if not self.stop_search:
+                    self.depth_reached = self.depth
+
+        if self.smp is not None:
+            for move, eval, depth, nodes in self.smp.stop_search():
+                self.nodes_searched += nodes
+                # a helper that completed a deeper iteration has the better move
+                if move is not None and depth > self.depth_reached:
+                    best_move, best_eval, self.depth_reached = move, eval, depth
+                    self.pv = [move]
+
+        if best_move is not None:
+            self.score = best_eval
+        else:
+            # stopped before the first iteration finished, still answer with a legal move when there is one
+            best_move = self._fallback_move()
 
-        if self.depth != DEFAULT_DEPTH:
-            self.depth = DEFAULT_DEPTH
+        if self.depth != self.original_depth:
+            self.depth = self.original_depth
         return best_move
 
+    def _fallback_move(self):
+        board = self.board.board
+        if self.use_tt:
+            tt_entry = self.ttable.check_pos_in_table(self.board.hash, 0, -INFINITY, INFINITY)
+            if tt_entry is not None and tt_entry[1] is not None and board.is_legal(tt_entry[1]):
+                return tt_entry[1]
+        return next(iter(board.legal_moves), None)
+
+    def _update_pv(self, best_move):
+        pv = self.pv_table[0]
+        # an interrupted or failed-low root may not have recorded its move
+        self.pv = list(pv) if pv and pv[0] == best_move else [best_move]
+
+    def _hashfull(self):
+        return self.ttable.hashfull() if self.use_tt else None
+
+    def _report_iteration(self, depth, eval):
+        # mate is the signed number of moves to mate, None for a normal score
+        mate = None
+        if abs(eval) >= MATE_THRESHOLD:
+            moves = (MATE_SCORE - abs(eval) + 1) // 2
+            mate = moves if eval > 0 else -moves
+        now = time.time()
+        self.last_info_time = now
+        self.info_callback(dict(depth=depth, score=eval, mate=mate, nodes=self.nodes_searched,
+                                time=now - self.start_time, hashfull=self._hashfull(), pv=list(self.pv)))
+
+    def _report_progress(self):
+        now = time.time()
+        if now - self.last_info_time >= INFO_INTERVAL:
+            self.last_info_time = now
+            self.info_callback(dict(nodes=self.nodes_searched, time=now - self.start_time, hashfull=self._hashfull()))
+
     def _time_exceeded(self):
+        # polled every NODE_TIME_CHECK nodes, which is also when progress is reported
+        if self.info_callback is not None and self.last_info_time is not None:
+            self._report_progress()
+        if self.stop_event is not None and self.stop_event.is_set():
+            self.stop_search = True
+            return True
+        if self.deadline is not None and time.time() >= self.deadline:
+            self.stop_search = True
+            return True
         if self.time_limit is None:
             return False
         if (time.time() - self.start_time) >= self.time_limit:
@@ -183,36 +245,74 @@ class MinimaxEngine:
 
     def _evaluate(self, ply_from_root):
         self.nodes_evaluated += 1
-        board = self.board.board
-        if board.is_checkmate():
-            mate_score = MATE_SCORE - ply_from_root
-            return -mate_score if board.turn else mate_score #inf doesn't work, because gives up, can give + depth for faster mate privileges
-        if board.is_stalemate() or board.is_insufficient_material():
-            return 0
-
-
-        # initialiser une fois les maps pour accélérer
-        eval = 0
-
-        for piece_type in Piece_values:
-            for color in [chess.WHITE, chess.BLACK]:
-                for square in board.pieces(piece_type, color):
-                    pst_value = self.maps[piece_type][color][self.ending].map[chess.square_file(square) + (7-chess.square_rank(square)) * 8]
-                    #print(chess.square_file(square), (7-chess.square_rank(square))*8)
-                    if color == chess.WHITE:
-                        eval += pst_value + Piece_values[piece_type]
-                        #print(pst_value, Piece_values[piece_type], "wh")
-                    else:
-                        eval -= pst_value + Piece_values[piece_type]
-                        #print(pst_value, Piece_values[piece_type], "bl")
-
-        return eval
-
-    def _quiescence_search(self, alpha, beta, turn, ply_from_root):
-
-        # if pv_line is None:
-        #     pv_line = []
+        # mate, stalemate and draws are detected by the search, not here
+
+        # material + piece square sums are kept up to date by the board on push/pop,
+        # blended by the remaining material so trades inside the tree shift towards the endgame tables
+        phase = min(self.board.phase, TOTAL_PHASE)
+        return (self.board.mg_eval * phase + self.board.eg_eval * (TOTAL_PHASE - phase)) // TOTAL_PHASE
+
+    def _aspiration_search(self, depth, previous_eval):
+        # narrow window around the previous iteration, widened on fail-low/fail-high
+        if (not self.use_pruning or previous_eval is None or depth < ASPIRATION_MIN_DEPTH
+                or abs(previous_eval) >= MATE_THRESHOLD):
+            return self._negamax(depth, -INFINITY, INFINITY, 0)
+
+        delta = ASPIRATION_WINDOW
+        alpha = max(previous_eval - delta, -INFINITY)
+        beta = min(previous_eval + delta, INFINITY)
+        while True:
+            eval, move = self._negamax(depth, alpha, beta, 0)
+            if eval is TIME_ABORT or self.stop_search:
+                return eval, move
+
+            if eval <= alpha:
+                alpha = max(eval - delta, -INFINITY)
+            elif eval >= beta:
+                beta = min(eval + delta, INFINITY)
+            else:
+                return eval, move
+            delta *= 2
+
+    def _root_split_search(self, depth, previous_eval, best_move):
+        # root moves go to the worker pool against a bound just under the previous score,
+        # if they all fail low the bound was wrong and they are searched again with the full window
+        alpha = -INFINITY
+        if abs(previous_eval) < MATE_THRESHOLD:
+            alpha = previous_eval - ASPIRATION_WINDOW
+        eval, move = self.root_split.search(depth, alpha, INFINITY, best_move)
+        if move is None and alpha > -INFINITY and not self.stop_search:
+            eval, move = self.root_split.search(depth, -INFINITY, INFINITY, best_move)
+        if move is None:
+            return TIME_ABORT, None
+        return eval, move
 
+    def search_root_move(self, move, depth, alpha, beta):
+        # searches a single root move for the root split workers,
+        # returns its score for the side to move (None if stopped) and the line after it
+        self.nodes_searched = 0
+        self.stop_search = False
+        self.start_time = time.time()
+        self.pv = []
+        self.follow_pv = False
+        self.call_depth = depth
+        self.repetition_table.seed(self.board.hash_history(self.board.board.halfmove_clock), self.board.hash)
+        self.move_order.clear_killer_moves()
+
+        self.board.push(move)
+        self.repetition_table.push(self.board.hash)
+        # null window first, most moves only have to prove they don't beat the best one so far
+        eval, _ = self._negamax(depth - 1, -alpha - 1, -alpha, 1)
+        if eval is not TIME_ABORT and alpha < -eval < beta and beta - alpha > 1:
+            eval, _ = self._negamax(depth - 1, -beta, -alpha, 1)
+        self.repetition_table.pop()
+        self.board.pop()
+
+        if eval is TIME_ABORT:
+            return None, []
+        return -eval, list(self.pv_table[1])
+
+    def _quiescence_search(self, alpha, beta, ply_from_root):
         if self.stop_search:
             return TIME_ABORT
 
@@ -226,67 +326,51 @@ class MinimaxEngine:
         board = self.board.board
 
         stand_pat = self._evaluate(ply_from_root)
-
-        best_eval = stand_pat
+        if not board.turn:
+            stand_pat = -stand_pat
 
         if not self.quiescence:
-            return best_eval
+            return stand_pat
 
-        if turn:
-            if best_eval >= beta:
-                return best_eval
-            elif best_eval > alpha:
-                alpha = best_eval
-
-        else:
-            if best_eval <= alpha:
-                return best_eval
-            elif best_eval < beta:
-                beta = best_eval
+        if stand_pat >= beta:
+            return stand_pat
 
+        # delta pruning: even winning a queen (and promoting) can't reach alpha
+        if self.board.phase > 0 and stand_pat + 2 * Piece_values[chess.QUEEN] - Piece_values[chess.PAWN] < alpha:
+            return stand_pat
 
-        order_moves = self.move_order.order_quiescence_moves(board, Piece_values)
-
-        # if self.debug:
-        #     indent = "  " * (self.original_depth + 1)
-        #     self._tree_lines.append(f"{indent}QUIET depth standpat={stand_pat} PV={' '.join(pv_line)}")
-
-        if turn:
-
-            for move in order_moves:
-                if self.stop_search:
-                    return TIME_ABORT
-                board.push(move)
-                score = self._quiescence_search(alpha, beta, not turn, ply_from_root+1)
-                board.pop()
-                if score is TIME_ABORT:
-                    self.stop_search = True
-                    break
+        if stand_pat > alpha:
+            alpha = stand_pat
+        best_eval = stand_pat
 
-                if score >= beta:
-                    return score
-                elif score > alpha:
+        for move in self.move_order.order_quiescence_moves(board, Piece_values):
+            # delta pruning per move: the captured piece plus a margin doesn't raise alpha
+            captured = board.piece_type_at(move.to_square)
+            gain = Piece_values[captured] if captured else Piece_values[chess.PAWN] if board.is_en_passant(move) else 0
+            if move.promotion:
+                gain += Piece_values[move.promotion] - Piece_values[chess.PAWN]
+            if self.board.phase > 0 and stand_pat + gain + DELTA_MARGIN <= alpha:
+                continue
+
+            self.board.push(move)
+            score = self._quiescence_search(-beta, -alpha, ply_from_root + 1)
+            self.board.pop()
+            if score is TIME_ABORT:
+                self.stop_search = True
+                return TIME_ABORT
+
+            score = -score
+            if score >= beta:
+                return score
+            if score > best_eval:
+                best_eval = score
+                if score > alpha:
                     alpha = score
-                best_eval = max(best_eval, score)
-        else:
-            for move in order_moves:
-                board.push(move)
-                score = self._quiescence_search(alpha, beta, not turn, ply_from_root+1)
-                board.pop()
-                if score is TIME_ABORT:
-                    self.stop_search = True
-                    break
-
-                if score <= alpha:
-                    return score
-                elif score < beta:
-                    beta = score
-                best_eval = min(best_eval, score)
 
         return best_eval
 
-
-    def _minimax(self, depth, turn):
+    def _negamax(self, depth, alpha, beta, ply_from_root):
+        # scores are from the side to move's point of view, features are switched by engine_type
         if self.stop_search:
             return TIME_ABORT, None
 
@@ -297,253 +381,207 @@ class MinimaxEngine:
             return TIME_ABORT, None
 
         board = self.board.board
+        key = self.board.hash
+        self.pv_table[ply_from_root] = []
+
+        # draws that don't need move generation, mate and stalemate are found from the empty move list below
+        if ply_from_root > 0:
+            if board.halfmove_clock >= 100 or self.repetition_table.is_repetition(key, board.halfmove_clock):
+                return 0, None
+            if chess.popcount(board.occupied) <= 4 and board.is_insufficient_material():
+                return 0, None
+
+        in_check = board.is_check()
+        if depth <= 0 or ply_from_root >= MAX_PLY - 1:
+            # a check at the horizon is searched one more ply so mates are seen from the move list
+            if in_check and ply_from_root < MAX_PLY - 1:
+                depth = 1
+            elif self.use_pruning:
+                return self._quiescence_search(alpha, beta, ply_from_root), None
+            else:
+                score = self._evaluate(ply_from_root)
+                return (score if board.turn else -score), None
 
-        #if self.repetition_table.is_repetition(board):
-            #return 0, None #put after next if check
-
-        if depth == 0 or board.is_game_over() or board.is_repetition(3):
-            return self._evaluate(self.call_depth-depth), None
+        if ply_from_root == 0:
+            self.follow_pv = True
 
-        legal_moves_ordered = board.legal_moves
-        if self.order_moves:
-            legal_moves_ordered = self.move_order.order_moves(board, self.pv_move, Piece_values, depth)
+        # previous iteration's line while we are still on it, else the transposition table's best move
+        hash_move = None
+        if self.follow_pv:
+            if ply_from_root < len(self.pv):
+                hash_move = self.pv[ply_from_root]
+            else:
+                self.follow_pv = False
 
-        best_move = None
-        if turn:
-            max_eval = -math.inf
-            for move in legal_moves_ordered:
-                board.push(move)
-                self.repetition_table.add_position(board)
-                eval, temp_move = self._minimax(depth - 1, not turn)
-                self.repetition_table.remove_position(board)
-                board.pop()
-                if eval is TIME_ABORT:
-                    self.stop_search = True
-                    break
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-            if max_eval == -math.inf:
-                return TIME_ABORT, None
-            return max_eval, best_move
-        else:
-            min_eval = math.inf
-            for move in legal_moves_ordered:
-                board.push(move)
-                self.repetition_table.add_position(board)
-                eval, temp_move = self._minimax(depth - 1, not turn)
-                self.repetition_table.remove_position(board)
-                board.pop()
+        alpha_original = alpha
+        if self.use_tt:
+            tt_entry = self.ttable.check_pos_in_table(key, depth, alpha, beta)
+            if tt_entry is not None:  # no entry
+                self.transpositions_found += 1
+                # entry useful, but not at pv nodes where the cutoff would leave the pv table without the line
+                if tt_entry[0] is not None and ply_from_root > 0 and beta - alpha == 1:
+                    self.transpositions_used += 1
+                    return tt_entry[0], tt_entry[1]
+                if hash_move is None:
+                    hash_move = tt_entry[1]
+
+        futile = False
+        if self.use_pruning and not in_check and ply_from_root > 0 and beta - alpha == 1:
+            # non-pv node: try to prove a cutoff or a fail-low without a full search
+            static_eval = self._evaluate(ply_from_root)
+            if not board.turn:
+                static_eval = -static_eval
+
+            # reverse futility: far enough above beta that a quiet move won't lose it
+            if (self.futility_pruning and depth <= REVERSE_FUTILITY_DEPTH and abs(beta) < MATE_THRESHOLD
+                    and static_eval - REVERSE_FUTILITY_MARGIN * depth >= beta):
+                return static_eval, None
+
+            # null move: passing still fails high, skipped in pawn endings where zugzwang is likely
+            non_pawn_mask = board.occupied_co[board.turn] & ~(board.pawns | board.kings)
+            if (self.null_move and depth >= NULL_MOVE_MIN_DEPTH and static_eval >= beta and non_pawn_mask
+                    and board.move_stack and board.move_stack[-1]):
+                reduction = min(2 + depth // 4, depth - 2)  # leave at least one ply to see threats
+                self.board.push(chess.Move.null())
+                self.repetition_table.push(self.board.hash, null_move=True)
+                eval, _ = self._negamax(depth - 1 - reduction, -beta, -beta + 1, ply_from_root + 1)
+                self.repetition_table.pop()
+                self.board.pop()
                 if eval is TIME_ABORT:
                     self.stop_search = True
-                    break
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-            if min_eval == math.inf:
-                return TIME_ABORT, None
-            return min_eval, best_move
-
-    def _minimax_pruning(self, depth, alpha, beta, turn):
-        if self.stop_search:
-            return TIME_ABORT, None
-
-        self.nodes_searched += 1
-        if self.nodes_searched % NODE_TIME_CHECK == 0 and self._time_exceeded():
-            self.stop_search = True
-            self.nodes_searched -= 1
-            return TIME_ABORT, None
-
-        board = self.board.board
-
-        #print("Depth:", depth, "alpha:", alpha, "beta:", beta, "turn:", board.turn)
+                    return TIME_ABORT, None
+                if -eval >= beta:
+                    return (beta if -eval >= MATE_THRESHOLD else -eval), None
 
-        #if self.repetition_table.is_repetition(board):
-            #return 0, None
-        if board.is_game_over() or board.is_repetition(3):
-            return self._evaluate(self.call_depth-depth), None
-        if depth == 0:
-            return self._quiescence_search(alpha, beta, turn, self.call_depth-depth), None
-            #return self._evaluate(self.call_depth-depth), None
+            # futility: at frontier nodes quiet moves can't bring the score up to alpha
+            futile = (self.futility_pruning and depth < len(FUTILITY_MARGINS) and abs(alpha) < MATE_THRESHOLD
+                      and static_eval + FUTILITY_MARGINS[depth] <= alpha)
 
         legal_moves_ordered = board.legal_moves
         if self.order_moves:
-            legal_moves_ordered = self.move_order.order_moves(board, self.pv_move, Piece_values, depth)
+            legal_moves_ordered = self.move_order.order_moves(board, hash_move, Piece_values, ply_from_root)
 
+        best_eval = -INFINITY
         best_move = None
-        if turn:
-            max_eval = -math.inf
-            for move in legal_moves_ordered:
-                board.push(move)
-                #self.repetition_table.add_position(board)
-                #print("move: ", move, board.turn)
-                eval, temp_move = self._minimax_pruning(depth - 1, alpha, beta, not turn)
-                #self.repetition_table.remove_position(board)
-                board.pop()
-                if eval is TIME_ABORT:
-                    self.stop_search = True
-                    break
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    self.move_order.store_killer_move(depth, move, board)
-                    break
-            #print("max_eval:", max_eval, "best_move:", best_move)
-            if max_eval == -math.inf:
-                return TIME_ABORT, None
-            return max_eval, best_move
-        else:
-            min_eval = math.inf
-            for move in legal_moves_ordered:
-                board.push(move)
-                #self.repetition_table.add_position(board)
-                #print("move: ", move, board.turn)
-                eval, temp_move = self._minimax_pruning(depth - 1, alpha, beta, not turn)
-                #self.repetition_table.remove_position(board)
-                board.pop()
-                if eval is TIME_ABORT:
-                    self.stop_search = True
-                    break
-
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                beta = min(beta, eval)
-                if beta<=alpha:
-                    self.move_order.store_killer_move(depth, move, board)
-                    break
-
-            #print("min_eval:", min_eval, "best_move:", best_move)
-            if min_eval == math.inf:
-                return TIME_ABORT, None
-            return min_eval, best_move
-
-
-    def _minimax_pruning_tt(self, depth, alpha, beta, turn):
-        # if pv_line is None:
-        #     pv_line = []
+        moves_searched = 0
+        quiets_tried = []
+        for move in legal_moves_ordered:
+            if self.stop_search:
+                break
+            if self.follow_pv and (moves_searched > 0 or move != hash_move):
+                self.follow_pv = False
+            is_quiet = not move.promotion and not board.is_capture(move)
+            if futile and moves_searched > 0 and is_quiet and not board.gives_check(move):
+                continue
+            if is_quiet:
+                quiets_tried.append(move)
+            self.board.push(move)
+            self.repetition_table.push(self.board.hash)
+
+            if not self.use_pruning:
+                eval, _ = self._negamax(depth - 1, -INFINITY, INFINITY, ply_from_root + 1)
+            elif moves_searched == 0:
+                eval, _ = self._negamax(depth - 1, -beta, -alpha, ply_from_root + 1)
+            else:
+                # late move reductions: quiet moves ordered late are searched shallower first
+                reduction = 0
+                if (self.late_move_reductions and ply_from_root > 0 and depth >= LMR_MIN_DEPTH
+                        and moves_searched >= LMR_MIN_MOVES and is_quiet and not in_check and not board.is_check()):
+                    reduction = 1 + (moves_searched >= 2 * LMR_MIN_MOVES)
+                    if beta - alpha > 1:
+                        reduction -= 1
+                    if self.move_order.history_score(not board.turn, move) > 0:
+                        reduction -= 1
+                    reduction = max(0, min(reduction, depth - 2))
+
+                # principal variation search: prove the move is worse with a null window, re-search if not
+                eval, _ = self._negamax(depth - 1 - reduction, -alpha - 1, -alpha, ply_from_root + 1)
+                if reduction > 0 and eval is not TIME_ABORT and -eval > alpha:
+                    eval, _ = self._negamax(depth - 1, -alpha - 1, -alpha, ply_from_root + 1)
+                if eval is not TIME_ABORT and alpha < -eval < beta:
+                    eval, _ = self._negamax(depth - 1, -beta, -alpha, ply_from_root + 1)
+            moves_searched += 1
+
+            self.repetition_table.pop()
+            self.board.pop()
+
+            if eval is TIME_ABORT:
+                self.stop_search = True
+                break
+
+            eval = -eval
+            if eval > best_eval:
+                best_eval = eval
+                best_move = move
+                if eval > alpha:
+                    alpha = eval
+                    self.pv_table[ply_from_root] = [move] + self.pv_table[ply_from_root + 1]
+            if self.use_pruning and alpha >= beta:
+                if is_quiet:
+                    self.move_order.store_killer_move(ply_from_root, move, board)
+                    self.move_order.store_history_move(board, move, depth, quiets_tried)
+                    self.move_order.store_countermove(board, move)
+                break
+
+        if best_move is None and not self.stop_search:
+            # no legal moves: checkmate or stalemate
+            if in_check:
+                return -(MATE_SCORE - ply_from_root), None
+            return 0, None
 
         if self.stop_search:
+            # the root keeps the best move of the moves it finished
+            if ply_from_root == 0 and best_move is not None:
+                return best_eval, best_move
             return TIME_ABORT, None
 
-        self.nodes_searched += 1
-        if self.nodes_searched % NODE_TIME_CHECK == 0 and self._time_exceeded():
-            self.stop_search = True
-            self.nodes_searched -= 1
-            return TIME_ABORT, None
-
-        board = self.board.board
-
-        #print("Depth:", depth, "alpha:", alpha, "beta:", beta, "turn:", board.turn)
-
-        if self.repetition_table.is_repetition(board) or board.is_repetition(3):
-            return 0, None
-        if board.is_game_over():
-            return self._evaluate(self.call_depth - depth), None
-        if depth == 0:
-            return self._quiescence_search(alpha, beta, turn, self.call_depth - depth), None
-            # return self._evaluate(self.call_depth-depth), None
-
-        # if self.debug:
-        #     indent = "  " * (self.original_depth - depth)
-        #     self._tree_lines.append(
-        #         f"{indent}D={depth} turn={'W' if turn else 'B'} alpha={alpha} beta={beta} PV={' '.join(pv_line)}")
-
-        alpha_original = alpha
-        beta_original = beta
-        tt_entry = self.ttable.check_pos_in_table(board, depth, alpha, beta)
-        if tt_entry is not None:  # no entry
-            self.transpositions_found += 1
-            if tt_entry != 0:  # entry useful
-                self.transpositions_used += 1
-                return tt_entry["score"], tt_entry["bestmove"]
-
-        legal_moves_ordered = board.legal_moves
-        if self.order_moves:
-            legal_moves_ordered = self.move_order.order_moves(board, self.pv_move, Piece_values, depth)
-
-        best_move = None
-        cur_eval = None
-        if turn:
-            max_eval = -math.inf
-            for move in legal_moves_ordered:
-                if self.stop_search:
-                    return TIME_ABORT, None
-                board.push(move)
-                self.repetition_table.add_position(board)
-                #print("move: ", move, board.turn)
-
-                eval, temp_move = self._minimax_pruning_tt(depth - 1, alpha, beta, not turn)
-
-                self.repetition_table.remove_position(board)
-                board.pop()
-
-                if eval is TIME_ABORT:
-                    self.stop_search = True
-                    break
-
-                if eval > max_eval:
-                    max_eval = eval
-                    best_move = move
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    self.move_order.store_killer_move(depth, move, board)
-                    break
-            #print("min_eval:", max_eval, "best_move:", best_move)
-            if max_eval == -math.inf:
-                return TIME_ABORT, None
-            cur_eval = max_eval
-        else:
-            min_eval = math.inf
-            for move in legal_moves_ordered:
-                if self.stop_search:
-                    return TIME_ABORT, None
-                board.push(move)
-                self.repetition_table.add_position(board)
-                #print("move: ", move, board.turn)
-
-                eval, temp_move = self._minimax_pruning_tt(depth - 1, alpha, beta, not turn)
-
-                self.repetition_table.remove_position(board)
-                board.pop()
-
-                if eval is TIME_ABORT:
-                    self.stop_search = True
-                    break
-
-                if eval < min_eval:
-                    min_eval = eval
-                    best_move = move
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    self.move_order.store_killer_move(depth, move, board)
-                    break
-            #print("min_eval:", min_eval, "best_move:", best_move)
-            if min_eval == math.inf:
-                return TIME_ABORT, None
-            cur_eval = min_eval
-
-        flag = "EXACT"
-        if cur_eval <= alpha_original:
-            flag = "UPPER"
-        elif cur_eval >= beta_original:
-            flag = "LOWER"
-
-        self.ttable.store(board, depth, cur_eval, flag, best_move)
-
-        # if self.debug:
-        #     indent = "  " * (self.original_depth - depth)
-        #     bm = best_move.uci() if best_move else None
-        #     self._tree_lines.append(f"{indent}=> score={cur_eval} best={bm} PV={' '.join(pv_line)}")
-
-        return cur_eval, best_move
-
-    def tt_too_large(self):
-        size_bytes = sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.ttable.table.items())
-        size_mb = size_bytes / (1024 * 1024)
-        return size_mb > MAX_TT_SIZE_MB
+        if self.use_tt:
+            flag = EXACT
+            if best_eval <= alpha_original:
+                flag = UPPER
+            elif best_eval >= beta:
+                flag = LOWER
+            self.ttable.store(key, depth, best_eval, flag, best_move)
+
+        return best_eval, best_move
+
+    def worker_options(self):
+        # keyword arguments for an engine in another process that searches like this one
+        return dict(engine_type=self.engine_type, move_ordering=self.order_moves, quiescence=self.quiescence,
+                    null_move=self.null_move, late_move_reductions=self.late_move_reductions,
+                    futility_pruning=self.futility_pruning, tt_size_mb=self.ttable.size_mb)
+
+    def set_threads(self, threads):
+        # one search runs here, the others in lazy smp helper processes sharing the transposition table
+        threads = min(max(threads, MIN_THREADS), MAX_THREADS)
+        if self.smp is not None:
+            self.smp.close()
+            self.smp = None
+        self.threads = threads
+        if threads > 1:
+            self.smp = LazySMP(self, threads - 1)
+
+    def set_root_split(self, workers):
+        # 0 or 1 turns the root split off, lazy smp (set_threads) is used instead when both are set
+        workers = min(max(workers, MIN_ROOT_SPLIT), MAX_ROOT_SPLIT)
+        if self.root_split is not None:
+            self.root_split.close()
+            self.root_split = None
+        if workers > 1:
+            self.root_split = RootSplit(self, workers)
+
+    def set_hash(self, size_mb):
+        # the shared block has a fixed size and the root split workers keep the size they were built with,
+        # rebuild both around the new table
+        if self.smp is not None:
+            self.smp.close()
+        if self.root_split is not None:
+            self.root_split.close()
+        self.ttable.resize(size_mb)
+        if self.smp is not None:
+            self.smp = LazySMP(self, self.threads - 1)
+        if self.root_split is not None:
+            self.root_split = RootSplit(self, self.root_split.workers)
 
     def print_tree(self):
         #print("Debug Trees")
@@ -557,17 +595,18 @@ class MinimaxEngine:
         self.transpositions_found = 0
         self.transpositions_used = 0
 
-        self.ending = False
         self.opening = True
 
-        self.pv_move = None
+        self.pv = []
         if time_reset:
             self.time_limit = None
         self.start_time = None
+        self.deadline = None
         self.stop_search = False
 
-        self.repetition_table.positions.clear()
+        self.repetition_table.clear()
 
-        self.ttable.table.clear()
+        self.ttable.clear()
 
-        self.move_order.clear_killer_moves()
\ No newline at end of file
+        self.move_order.clear_killer_moves()
+        self.move_order.clear_history()
\ No newline at end of file
@@ -1,17 +1,24 @@
 import chess
+from array import array
+from engine.see import static_exchange_evaluation
 
 KILLER_SCORE = 3500
 PV_SCORE = 100000
+MAX_KILLER_PLY = 128
+HISTORY_MAX = 1 << 20
 
 class MoveOrder:
     def __init__(self, killers_store_size: int=2):
-        self.killer_moves = {}
+        self.killer_moves = [[] for _ in range(MAX_KILLER_PLY)]  # indexed by ply
         self.killers_store_size = killers_store_size
+        # butterfly history [color][from][to] and countermoves [previous from][previous to]
+        self.history = array("i", bytes(4 * 2 * 64 * 64))
+        self.countermoves = [None] * (64 * 64)
 
-    def store_killer_move(self, depth, move, board):
-        if board.is_capture(move):
+    def store_killer_move(self, ply, move, board):
+        if board.is_capture(move) or ply >= MAX_KILLER_PLY:
             return
-        killers = self.killer_moves.setdefault(depth, [])
+        killers = self.killer_moves[ply]
 
         if move in killers:
             return
@@ -24,13 +31,40 @@ class MoveOrder:
             killers.pop(0)
             killers.append(move)
 
-        self.killer_moves[depth] = killers
-
     def clear_killer_moves(self):
-        self.killer_moves.clear()
-
-    def killer_score(self, move, depth):
-        killers = self.killer_moves.get(depth, [])
+        for killers in self.killer_moves:
+            killers.clear()
+
+    def store_history_move(self, board, move, depth, quiets_tried):
+        # reward the quiet move that cut off, penalise the quiet moves searched before it
+        history = self.history
+        color_offset = board.turn * 4096
+        bonus = depth * depth
+        history[color_offset + move.from_square * 64 + move.to_square] += bonus
+        for quiet in quiets_tried:
+            if quiet != move:
+                history[color_offset + quiet.from_square * 64 + quiet.to_square] -= bonus
+        if abs(history[color_offset + move.from_square * 64 + move.to_square]) >= HISTORY_MAX:
+            self.age_history()
+
+    def history_score(self, color, move):
+        return self.history[color * 4096 + move.from_square * 64 + move.to_square]
+
+    def store_countermove(self, board, move):
+        if board.move_stack:
+            previous = board.move_stack[-1]
+            self.countermoves[previous.from_square * 64 + previous.to_square] = move
+
+    def age_history(self):
+        # called between searches so old results fade instead of dominating
+        self.history = array("i", (value >> 1 for value in self.history))
+
+    def clear_history(self):
+        self.history = array("i", bytes(4 * 2 * 64 * 64))
+        self.countermoves = [None] * (64 * 64)
+
+    def killer_score(self, move, ply):
+        killers = self.killer_moves[ply] if ply < MAX_KILLER_PLY else []
         if move in killers:
         # newer killer (index -1) gets slightly higher implicit score
             if len(killers) == self.killers_store_size and move == killers[-1]:
@@ -38,70 +72,79 @@ class MoveOrder:
             return KILLER_SCORE
         return 0
 
-    def order_moves(self, board, pv_move, piece_values, depth):
-        moves = board.legal_moves
+    def order_moves(self, board, pv_move, piece_values, ply):
+        # staged and lazy: a cutoff in an early stage skips generating and scoring the later ones
+        # 1. hash / pv move, no generation needed
+        if pv_move is not None and board.is_legal(pv_move):
+            yield pv_move
+        else:
+            pv_move = None
+
+        # 2. winning and even captures and promotions, most valuable victim / least valuable attacker
+        good_captures, bad_captures = self._noisy_moves(board, piece_values)
+        for move in good_captures:
+            if move != pv_move:
+                yield move
+
+        # 3. killers (newest first), then the countermove to the opponent's last move
+        candidates = list(reversed(self.killer_moves[ply])) if ply < MAX_KILLER_PLY else []
+        if board.move_stack:
+            previous = board.move_stack[-1]
+            countermove = self.countermoves[previous.from_square * 64 + previous.to_square]
+            if countermove is not None:
+                candidates.append(countermove)
+        tried = [pv_move]
+        for move in candidates:
+            if move not in tried and not move.promotion and not board.is_capture(move) and board.is_legal(move):
+                tried.append(move)
+                yield move
+
+        # 4. remaining quiet moves by history score
+        history = self.history
+        color_offset = board.turn * 4096
         moves_scores = []
-
-        for move in moves:
-            move_score_guess = 0
-            move_piece = board.piece_type_at(move.from_square)
-            move_capture_piece = board.piece_type_at(move.to_square)
-
-            #principle variation first
-            if pv_move is not None and move==pv_move:
-                move_score_guess += PV_SCORE
-                #print("hi", pv_move)
-
-            #capture high piece with low piece
-            if move_capture_piece is not None:
-                is_attacking = move.to_square in board.attacks(move.from_square)
-                if is_attacking:
-                    move_score_guess += 10 * piece_values[move_capture_piece] - piece_values[move_piece]
-
-            #promoting pawn
-            if move.promotion is not None:
-                move_score_guess += 10 * piece_values[move.promotion]
-
-            #move where piece will be attacked
-            if board.is_attacked_by(not board.turn, move.to_square):
-                move_score_guess -= piece_values[move_piece]
-
-            #killer move score
-            move_score_guess += self.killer_score(move, depth)
-
-
-            moves_scores.append((move_score_guess, move))
+        for move in board.generate_legal_moves(chess.BB_ALL, ~board.occupied_co[not board.turn]):
+            if move.promotion or move in tried or board.is_en_passant(move):
+                continue
+            moves_scores.append((history[color_offset + move.from_square * 64 + move.to_square], move))
 
         moves_scores.sort(key=lambda x: x[0], reverse=True)
+        for score, move in moves_scores:
+            yield move
 
-        #sorted_moves = [x for _,x in sorted(zip(moves_scores, moves), key=lambda x: x[0], reverse = True)]
-        #sorted_moves_scores = sorted(moves_scores)
-
-        #return zip(sorted_moves, sorted_moves_scores)
-        return [move for score, move in moves_scores]
-
-    def order_quiescence_moves(self, board, piece_values):
-        moves = board.legal_moves
-
-        quiescence_moves = []
-        for move in moves:
-            if board.is_capture(move) or move.promotion is not None:
-                quiescence_moves.append(move)
-
+        # 5. captures that lose material by static exchange
+        for move in bad_captures:
+            if move != pv_move:
+                yield move
 
+    def _noisy_moves(self, board, piece_values):
+        # (good, bad): bad captures lose material by static exchange evaluation
         moves_scores = []
-        for move in quiescence_moves:
+        bad_scores = []
+        for move in board.generate_legal_captures():
             move_piece = board.piece_type_at(move.from_square)
-            move_capture_piece = board.piece_type_at(move.to_square)
-
-            move_score_guess = 0
+            move_capture_piece = board.piece_type_at(move.to_square) or chess.PAWN  # en passant
 
-            if move_capture_piece is not None:
-                move_score_guess = 10 * piece_values[move_capture_piece] - piece_values[move_piece]
+            move_score_guess = 10 * piece_values[move_capture_piece] - piece_values[move_piece]
             if move.promotion is not None:
                 move_score_guess += 10 * piece_values[move.promotion]
 
+            # taking an equal or bigger piece can't lose material, only check the others
+            if piece_values[move_piece] > piece_values[move_capture_piece]:
+                see = static_exchange_evaluation(board, move, piece_values)
+                if see < 0:
+                    bad_scores.append((see, move))
+                    continue
             moves_scores.append((move_score_guess, move))
 
+        # quiet promotions
+        for move in board.generate_legal_moves(board.pawns, chess.BB_BACKRANKS & ~board.occupied):
+            moves_scores.append((10 * piece_values[move.promotion], move))
+
         moves_scores.sort(key=lambda x: x[0], reverse=True)
-        return [move for score, move in moves_scores]
\ No newline at end of file
+        bad_scores.sort(key=lambda x: x[0], reverse=True)
+        return [move for score, move in moves_scores], [move for score, move in bad_scores]
+
+    def order_quiescence_moves(self, board, piece_values):
+        # losing captures are pruned from quiescence
+        return self._noisy_moves(board, piece_values)[0]
@@ -1,46 +1,102 @@
 import random
+import struct
+import threading
 import chess
+import chess.polyglot
 import os
 
-class Book_opening:
-    def __init__(self):
-        self.startfen = ''
-        self.opening_book = self._load_opening_book()
-
-    def _load_opening_book(self, path="../resources/opening_book.txt"):
+base_dir = os.path.dirname(os.path.abspath(__file__))
+TEXT_BOOK_PATH = os.path.join(base_dir, "../resources/opening_book.txt")
+BOOK_PATH = os.path.join(base_dir, "../resources/opening_book.bin")
 
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        path = os.path.join(base_dir, "../resources/opening_book.txt")
+MAX_WEIGHT = 0xFFFF
+ENTRY_STRUCT = struct.Struct(">QHHI")  # polyglot entry: key, move, weight, learn
+PROMOTION_CODES = {None: 0, chess.KNIGHT: 1, chess.BISHOP: 2, chess.ROOK: 3, chess.QUEEN: 4}
 
-        opening_book = {}
 
+def polyglot_move(board, move):
+    # polyglot stores castling as king takes own rook
+    if board.is_castling(move):
+        rook_file = 7 if chess.square_file(move.to_square) > chess.square_file(move.from_square) else 0
+        to_square = chess.square(rook_file, chess.square_rank(move.from_square))
+    else:
+        to_square = move.to_square
+    return (chess.square_file(to_square) | chess.square_rank(to_square) << 3
+            | chess.square_file(move.from_square) << 6 | chess.square_rank(move.from_square) << 9
+            | PROMOTION_CODES[move.promotion] << 12)
 
-        with open(path) as f:
-            lines = f.readlines()
 
-        current_fen = None
-        for line in lines:
+def convert_text_book(text_path=TEXT_BOOK_PATH, book_path=BOOK_PATH):
+    # "pos <fen>" lines followed by "<uci move> <frequency>" lines -> polyglot .bin sorted by key
+    positions = {}
+    board = None
+    with open(text_path) as f:
+        for line in f:
             line = line.strip()
-
             if line.startswith("pos"):
-                current_fen = line[4:]
-                opening_book[current_fen] = []
-                if self.startfen == '':
-                    self.startfen = current_fen
-            elif current_fen and line:
+                board = chess.Board(line[4:] + " 0 1")
+                moves = positions.setdefault(chess.polyglot.zobrist_hash(board), {})
+            elif board is not None and line:
                 move, freq = line.split()
-                opening_book[current_fen].append((move, int(freq)))
+                raw_move = polyglot_move(board, chess.Move.from_uci(move))
+                moves[raw_move] = moves.get(raw_move, 0) + int(freq)
 
-        return opening_book
+    entries = []
+    for key, moves in positions.items():
+        # weights are 16 bit, scale each position down keeping the ratios between its moves
+        scale = max(1, -(-max(moves.values()) // MAX_WEIGHT))
+        for raw_move, freq in moves.items():
+            entries.append((key, -max(1, freq // scale), raw_move))
+    entries.sort()
+
+    with open(book_path, "wb") as f:
+        for key, weight, raw_move in entries:
+            f.write(ENTRY_STRUCT.pack(key, raw_move, -weight, 0))
+    return len(entries)
+
+
+class Book_opening:
+    def __init__(self, path=BOOK_PATH):
+        # memory mapped, entries are found by binary search on the zobrist key
+        self.reader = chess.polyglot.open_reader(path)
 
     def opening_move(self, board):
+        # the board keeps the polyglot key of its position, no fen needed
+        position = board.board
+        moves = []
+        weights = []
+        for entry in self.reader.find_all(board.hash):
+            move = entry.move
+            if position.piece_type_at(move.from_square) == chess.KING and position.color_at(move.to_square) == position.turn:
+                # king takes own rook back to standard castling
+                to_file = 6 if move.to_square > move.from_square else 2
+                move = chess.Move(move.from_square, chess.square(to_file, chess.square_rank(move.from_square)))
+            moves.append(move)
+            weights.append(entry.weight)
+        if not moves:
+            return None
+        move = random.choices(moves, weights)[0]
+        return move if board.is_legal(move) else None
+
+    def close(self):
+        self.reader.close()
+
+
+_shared_book = None
+_shared_book_lock = threading.Lock()
+
 
-        fen = board.get_fen()[:-4]
-        if fen in self.opening_book:
-            moves = self.opening_book[fen]
-            move_str, freq = random.choice(moves)
-            #move_str, freq = max(moves, key=lambda x: x[1])
-            return chess.Move.from_uci(move_str)
-        return None
+def shared_book():
+    # one read-only book per process, opened on first use. The mapping is backed by the page cache,
+    # so forked or spawned workers opening the same file share its memory as well
+    global _shared_book
+    if _shared_book is None:
+        with _shared_book_lock:
+            if _shared_book is None:
+                _shared_book = Book_opening()
+    return _shared_book
 
 
+if __name__ == "__main__":
+    # rebuild resources/opening_book.bin from resources/opening_book.txt
+    print(f"{convert_text_book()} entries written to {os.path.normpath(BOOK_PATH)}")
@@ -0,0 +1,16 @@
+# limits of the engine options, kept free of imports so the uci layer can print them before loading the engine
+
+# transposition table size in MB
+DEFAULT_TT_SIZE_MB = 16
+MIN_TT_SIZE_MB = 1
+MAX_TT_SIZE_MB = 1024
+
+# searching processes, the main search plus lazy smp helpers
+DEFAULT_THREADS = 1
+MIN_THREADS = 1
+MAX_THREADS = 64
+
+# processes splitting the root moves of an iteration, 0 or 1 keeps the root split off
+DEFAULT_ROOT_SPLIT = 0
+MIN_ROOT_SPLIT = 0
+MAX_ROOT_SPLIT = 64
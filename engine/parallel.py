@@ -0,0 +1,107 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from board.board import ChessBoard
+from engine.piece_maps import Piece_values
+import chess
+
+ROOT_SPLIT_MIN_DEPTH = 3  # iterations up to this depth run sequentially for ordering and the bound
+WAIT_INTERVAL = 0.05
+
+# warm engine of a pool worker, kept between tasks so its board, tables and history are reused
+_worker_engine = None
+
+
+def _init_worker(engine_class, engine_options, stop_event):
+    global _worker_engine
+    _worker_engine = engine_class(ChessBoard(), **engine_options)
+    _worker_engine.opening = False
+    _worker_engine.stop_event = stop_event
+
+
+def _search_root_move(root_fen, moves, move, depth, alpha, beta, time_limit, age):
+    # replays the game so the repetition history matches, then searches one root move
+    engine = _worker_engine
+    board = engine.board
+    if board.board.root().fen() != root_fen or [m.uci() for m in board.board.move_stack] != moves:
+        board.set_fen(root_fen)
+        for uci_move in moves:
+            board.push(chess.Move.from_uci(uci_move))
+    engine.time_limit = time_limit
+    engine.ttable.age = age
+    score, pv = engine.search_root_move(chess.Move.from_uci(move), depth, alpha, beta)
+    return move, score, [m.uci() for m in pv], engine.nodes_searched
+
+
+class RootSplit:
+    def __init__(self, engine, workers: int):
+        # root moves of an iteration are searched in parallel by a pool of warm worker engines
+        self.engine = engine
+        self.workers = workers
+        self.stop_event = multiprocessing.Event()
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(type(engine), engine.worker_options(), self.stop_event))
+        self.root_moves = []
+
+    def new_search(self):
+        self.root_moves = []
+        self.stop_event.clear()
+
+    def search(self, depth, alpha, beta, hash_move):
+        # returns (score, move) for the best root move scoring above alpha,
+        # move is None when every move failed low or nothing finished in time
+        engine = self.engine
+        if not self.root_moves:
+            # first split iteration: the sequential best move first, then the engine's usual ordering
+            self.root_moves = list(engine.move_order.order_moves(engine.board.board, hash_move, Piece_values, 0))
+        board = engine.board.board
+        root_fen = board.root().fen()
+        moves = [m.uci() for m in board.move_stack]
+
+        # one move per worker at a time so each new task starts from the best score found so far
+        queued = list(self.root_moves)
+        pending = set()
+        best_score, best_move, scores = alpha, None, {}
+        while queued or pending:
+            while queued and len(pending) < self.workers:
+                pending.add(self.pool.submit(_search_root_move, root_fen, moves, queued.pop(0).uci(), depth,
+                                             best_score, beta, self._remaining_time(), engine.ttable.age))
+            done, pending = wait(pending, timeout=WAIT_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                move, score, pv, nodes = future.result()
+                engine.nodes_searched += nodes
+                if score is None:
+                    continue
+                move = chess.Move.from_uci(move)
+                scores[move] = score
+                # scores at or below alpha are only bounds, anything above it is exact
+                if score > best_score:
+                    best_score, best_move = score, move
+                    engine.pv_table[0] = [move] + [chess.Move.from_uci(m) for m in pv]
+            if (queued or pending) and (engine.stop_search or engine._time_exceeded()):
+                self.stop_event.set()
+                for future in pending:
+                    future.cancel()
+                wait(pending)
+                self.stop_event.clear()
+                break
+
+        if not engine.stop_search:
+            # next iteration tries the moves in the order of this one's scores
+            self.root_moves.sort(key=lambda m: scores.get(m, float("-inf")), reverse=True)
+        return best_score, best_move
+
+    def _remaining_time(self):
+        # workers restart their clock per task, so every task gets what is left of the main search's time
+        engine = self.engine
+        remaining = None
+        if engine.time_limit is not None:
+            remaining = engine.time_limit - (time.time() - engine.start_time)
+        if engine.deadline is not None:
+            until_deadline = engine.deadline - time.time()
+            remaining = until_deadline if remaining is None else min(remaining, until_deadline)
+        return None if remaining is None else max(0.0, remaining)
+
+    def close(self):
+        self.stop_event.set()
+        self.pool.shutdown(wait=True, cancel_futures=True)
@@ -1,95 +1,107 @@
 import chess
 
+Piece_values = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 20000}
+
+# piece square maps, written from white's point of view with a8 first
+PAWN_MAP = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+
+PAWN_ENDING_MAP = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    20, 20, 20, 20, 20, 20, 20, 20,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    10, 10, 10, 10, 10, 10, 10, 10,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+
+ROOK_MAP = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+
+KNIGHT_MAP = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+
+BISHOP_MAP = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+
+QUEEN_MAP = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+
+KING_MAP = (
+    -80, -70, -70, -70, -70, -70, -70, -80,
+    -60, -60, -60, -60, -60, -60, -60, -60,
+    -40, -50, -50, -60, -60, -50, -50, -40,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, -5, -5, -5, -5, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+)
+
+KING_ENDING_MAP = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    -10, -5, 20, 30, 30, 20, -5, -10,
+    -15, -10, 35, 45, 45, 35, -10, -15,
+    -20, -15, 30, 40, 40, 30, -15, -20,
+    -25, -20, 20, 25, 25, 20, -20, -25,
+    -30, -25, 0, 0, 0, 0, -25, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+
 class Piece_map:
     def __init__(self):
-        self.Pawn = [
-            0, 0, 0, 0, 0, 0, 0, 0,
-            50, 50, 50, 50, 50, 50, 50, 50,
-            10, 10, 20, 30, 30, 20, 10, 10,
-            5, 5, 10, 25, 25, 10, 5, 5,
-            0, 0, 0, 20, 20, 0, 0, 0,
-            5, -5, -10, 0, 0, -10, -5, 5,
-            5, 10, 10, -20, -20, 10, 10, 5,
-            0, 0, 0, 0, 0, 0, 0, 0
-
-        ]
-
-        self.Pawn_ending = [
-            0, 0, 0, 0, 0, 0, 0, 0,
-            80, 80, 80, 80, 80, 80, 80, 80,
-            50, 50, 50, 50, 50, 50, 50, 50,
-            30, 30, 30, 30, 30, 30, 30, 30,
-            20, 20, 20, 20, 20, 20, 20, 20,
-            10, 10, 10, 10, 10, 10, 10, 10,
-            10, 10, 10, 10, 10, 10, 10, 10,
-            0, 0, 0, 0, 0, 0, 0, 0
-        ]
-
-        self.Rook = [
-            0, 0, 0, 0, 0, 0, 0, 0,
-            5, 10, 10, 10, 10, 10, 10, 5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            -5, 0, 0, 0, 0, 0, 0, -5,
-            0, 0, 0, 5, 5, 0, 0, 0
-        ]
-
-        self.Knight = [
-            -50, -40, -30, -30, -30, -30, -40, -50,
-            -40, -20, 0, 0, 0, 0, -20, -40,
-            -30, 0, 10, 15, 15, 10, 0, -30,
-            -30, 5, 15, 20, 20, 15, 5, -30,
-            -30, 0, 15, 20, 20, 15, 0, -30,
-            -30, 5, 10, 15, 15, 10, 5, -30,
-            -40, -20, 0, 5, 5, 0, -20, -40,
-            -50, -40, -30, -30, -30, -30, -40, -50,
-        ]
-
-        self.Bishop = [
-            -20, -10, -10, -10, -10, -10, -10, -20,
-            -10, 0, 0, 0, 0, 0, 0, -10,
-            -10, 0, 5, 10, 10, 5, 0, -10,
-            -10, 5, 5, 10, 10, 5, 5, -10,
-            -10, 0, 10, 10, 10, 10, 0, -10,
-            -10, 10, 10, 10, 10, 10, 10, -10,
-            -10, 5, 0, 0, 0, 0, 5, -10,
-            -20, -10, -10, -10, -10, -10, -10, -20,
-        ]
-
-        self.Queen = [
-            -20, -10, -10, -5, -5, -10, -10, -20,
-            -10, 0, 0, 0, 0, 0, 0, -10,
-            -10, 0, 5, 5, 5, 5, 0, -10,
-            -5, 0, 5, 5, 5, 5, 0, -5,
-            0, 0, 5, 5, 5, 5, 0, -5,
-            -10, 5, 5, 5, 5, 5, 0, -10,
-            -10, 0, 5, 0, 0, 0, 0, -10,
-            -20, -10, -10, -5, -5, -10, -10, -20
-        ]
-
-        self.King = [
-            -80, -70, -70, -70, -70, -70, -70, -80,
-            -60, -60, -60, -60, -60, -60, -60, -60,
-            -40, -50, -50, -60, -60, -50, -50, -40,
-            -30, -40, -40, -50, -50, -40, -40, -30,
-            -20, -30, -30, -40, -40, -30, -30, -20,
-            -10, -20, -20, -20, -20, -20, -20, -10,
-            20, 20, -5, -5, -5, -5, 20, 20,
-            20, 30, 10, 0, 0, 10, 30, 20
-        ]
-
-        self.King_ending = [
-            -20, -10, -10, -10, -10, -10, -10, -20,
-            -5, 0, 5, 5, 5, 5, 0, -5,
-            -10, -5, 20, 30, 30, 20, -5, -10,
-            -15, -10, 35, 45, 45, 35, -10, -15,
-            -20, -15, 30, 40, 40, 30, -15, -20,
-            -25, -20, 20, 25, 25, 20, -20, -25,
-            -30, -25, 0, 0, 0, 0, -25, -30,
-            -50, -30, -30, -30, -30, -30, -30, -50
-        ]
+        self.Pawn = list(PAWN_MAP)
+        self.Pawn_ending = list(PAWN_ENDING_MAP)
+        self.Rook = list(ROOK_MAP)
+        self.Knight = list(KNIGHT_MAP)
+        self.Bishop = list(BISHOP_MAP)
+        self.Queen = list(QUEEN_MAP)
+        self.King = list(KING_MAP)
+        self.King_ending = list(KING_ENDING_MAP)
 
         self.map = []
 
@@ -134,3 +146,36 @@ class Piece_map:
                 self.map = self.Knight[::-1]
 
 
+MIDDLEGAME = 0
+ENDGAME = 1
+
+# game phase: 24 with all minor and major pieces on the board, 0 with only kings and pawns
+PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4, 0)  # indexed by piece type
+TOTAL_PHASE = 24
+
+PIECE_STRIDE = 64
+COLOR_STRIDE = 7 * PIECE_STRIDE  # piece types are 1..6, slot 0 unused
+PHASE_STRIDE = 2 * COLOR_STRIDE
+
+
+def pst_index(phase, color, piece_type, square):
+    return phase * PHASE_STRIDE + color * COLOR_STRIDE + piece_type * PIECE_STRIDE + square
+
+
+def _build_pst():
+    # material + piece square value signed from white's point of view, in python-chess square order
+    table = [0] * (2 * PHASE_STRIDE)
+    for phase in (MIDDLEGAME, ENDGAME):
+        for color in chess.COLORS:
+            piece_map = Piece_map()
+            sign = 1 if color == chess.WHITE else -1
+            for piece_type in chess.PIECE_TYPES:
+                piece_map.gen_map(piece_type, phase == ENDGAME, color)
+                for square in chess.SQUARES:
+                    value = piece_map.map[chess.square_file(square) + (7 - chess.square_rank(square)) * 8]
+                    table[pst_index(phase, color, piece_type, square)] = sign * (value + Piece_values[piece_type])
+    return tuple(table)
+
+
+# PST[pst_index(phase, color, piece_type, square)], built once at import
+PST = _build_pst()
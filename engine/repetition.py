@@ -1,22 +1,43 @@
-import chess
-from chess.polyglot import zobrist_hash
-
-
 class RepetitionTable:
     def __init__(self):
-        self.positions = {} # only for search lines so needs 6 plies for sure usage, else maintain game positions
+        # position keys of the game since the last irreversible move, followed by the current search line
+        self.keys = []
+        self.root_index = 0
+        self.null_moves = []  # indices of positions reached by a null move
+
+    def seed(self, history, root_key):
+        self.keys = list(history)
+        self.keys.append(root_key)
+        self.root_index = len(self.keys) - 1
+        self.null_moves.clear()
+
+    def push(self, key, null_move: bool = False):
+        if null_move:
+            self.null_moves.append(len(self.keys))
+        self.keys.append(key)
 
-    def add_position(self, board):
-        key = zobrist_hash(board)
-        self.positions[key] = self.positions.get(key, 0) + 1
+    def pop(self):
+        self.keys.pop()
+        if self.null_moves and self.null_moves[-1] == len(self.keys):
+            self.null_moves.pop()
 
-    def remove_position(self, board):
-        key = zobrist_hash(board)
-        self.positions[key] = self.positions.get(key, 0) - 1
-        if self.positions[key] <= 0:
-            self.positions.pop(key)
+    def clear(self):
+        self.keys.clear()
+        self.root_index = 0
+        self.null_moves.clear()
 
-    def is_repetition(self, board):
-        key = zobrist_hash(board)
-        #print("repetitions of pos:", self.positions.get(key, 0))
-        return self.positions.get(key, 0) >= 2
\ No newline at end of file
+    def is_repetition(self, key, halfmove_clock):
+        # only positions since the last irreversible move (and null move) with the same side to move can repeat;
+        # a repetition inside the search is a draw, one from before the root needs to be a threefold
+        keys = self.keys
+        current = len(keys) - 1
+        stop = max(current - halfmove_clock, self.null_moves[-1] if self.null_moves else 0)
+        count = 0
+        for i in range(current - 4, stop - 1, -2):
+            if keys[i] == key:
+                if i > self.root_index:
+                    return True
+                count += 1
+                if count >= 2:
+                    return True
+        return False
@@ -0,0 +1,61 @@
+import chess
+
+
+def attackers_mask(board, square, occupied):
+    # attackers of both colors with the given occupancy, so x-ray attackers appear as pieces are removed
+    queens_and_rooks = board.queens | board.rooks
+    queens_and_bishops = board.queens | board.bishops
+    attackers = (
+        (chess.BB_KING_ATTACKS[square] & board.kings) |
+        (chess.BB_KNIGHT_ATTACKS[square] & board.knights) |
+        (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] & queens_and_rooks) |
+        (chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied] & queens_and_rooks) |
+        (chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied] & queens_and_bishops) |
+        (chess.BB_PAWN_ATTACKS[chess.WHITE][square] & board.pawns & board.occupied_co[chess.BLACK]) |
+        (chess.BB_PAWN_ATTACKS[chess.BLACK][square] & board.pawns & board.occupied_co[chess.WHITE])
+    )
+    return attackers & occupied
+
+
+def static_exchange_evaluation(board, move, piece_values):
+    # material balance of the capture sequence started by move on its target square,
+    # both sides always recapture with their least valuable attacker and are free to stop
+    from_square = move.from_square
+    to_square = move.to_square
+    occupied = board.occupied ^ chess.BB_SQUARES[from_square]
+
+    captured = board.piece_type_at(to_square)
+    if captured is None and board.is_en_passant(move):
+        captured = chess.PAWN
+        occupied ^= chess.BB_SQUARES[to_square - 8 if board.turn else to_square + 8]
+
+    gain = [piece_values[captured] if captured else 0]
+    on_square = board.piece_type_at(from_square)
+    if move.promotion:
+        gain[0] += piece_values[move.promotion] - piece_values[chess.PAWN]
+        on_square = move.promotion
+
+    color = not board.turn
+    attackers = attackers_mask(board, to_square, occupied)
+    while True:
+        side_attackers = attackers & board.occupied_co[color]
+        if not side_attackers:
+            break
+
+        for piece_type in chess.PIECE_TYPES:
+            candidates = side_attackers & board.pieces_mask(piece_type, color)
+            if candidates:
+                break
+
+        # balance for the side capturing now, if the exchange stopped afterwards
+        gain.append(piece_values[on_square] - gain[-1])
+
+        occupied ^= candidates & -candidates
+        attackers = attackers_mask(board, to_square, occupied)
+        on_square = piece_type
+        color = not color
+
+    # each side only continues the exchange while it doesn't lose by doing so
+    for i in range(len(gain) - 1, 0, -1):
+        gain[i - 1] = -max(-gain[i - 1], gain[i])
+    return gain[0]
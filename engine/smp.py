@@ -0,0 +1,122 @@
+import atexit
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+from board.board import ChessBoard
+from engine.transposition import TranspositionTable, AGE_MASK, table_bytes
+import chess
+
+RESULT_POLL = 0.5  # seconds between liveness checks while waiting for the helpers to report
+
+
+def _helper_main(helper_id, engine_class, engine_options, shm_name, tasks, results, stop_event):
+    # helper process: searches the same root as the main engine until told to stop,
+    # only the shared transposition table carries its work back
+    shm = shared_memory.SharedMemory(name=shm_name)
+    board = ChessBoard()
+    # attach without clearing, the main search may already be filling the table
+    engine = engine_class(board, tt_buffer=shm.buf, **engine_options)
+    engine.opening = False
+    engine.stop_event = stop_event
+    # odd helpers start one iteration deeper so the workers don't all search the same depth at the same time
+    engine.start_depth = 1 + helper_id % 2
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        root_fen, moves, age = task
+        board.set_fen(root_fen)
+        for move in moves:
+            board.push(chess.Move.from_uci(move))
+        # no deadline of their own: helpers keep deepening until the stop event
+        engine.time_limit = float("inf")
+        # make_move advances the age, start one behind to land on the main search's generation
+        engine.ttable.age = (age - 1) & AGE_MASK
+        best_move = engine.make_move()
+        results.put((helper_id, best_move.uci() if best_move else None, engine.score, engine.depth_reached,
+                     engine.nodes_searched))
+
+    engine.ttable.release()
+    shm.close()
+
+
+class LazySMP:
+    def __init__(self, engine, helpers: int):
+        # the main engine searches in this process, helpers run in worker processes and share its table
+        self.engine = engine
+        self.helpers = helpers
+        size_mb = engine.ttable.size_mb
+        self.shm = shared_memory.SharedMemory(create=True, size=table_bytes(size_mb))
+        engine.ttable = TranspositionTable(size_mb, buffer=self.shm.buf)
+
+        engine_options = engine.worker_options()
+        # every helper gets its own task queue, one that crashes can't leave a shared queue locked
+        self.tasks = []
+        self.results = multiprocessing.Queue()
+        self.stop_event = multiprocessing.Event()
+        self.processes = []
+        for helper_id in range(1, helpers + 1):
+            tasks = multiprocessing.Queue()
+            process = multiprocessing.Process(target=_helper_main, daemon=True,
+                                              args=(helper_id, type(engine), engine_options, self.shm.name,
+                                                    tasks, self.results, self.stop_event))
+            process.start()
+            self.tasks.append(tasks)
+            self.processes.append(process)
+        self.searching = False
+        atexit.register(self.close)
+
+    def start_search(self):
+        # helpers replay the game from its root so their repetition history matches the main engine
+        board = self.engine.board.board
+        root_fen = board.root().fen()
+        moves = [move.uci() for move in board.move_stack]
+        self.stop_event.clear()
+        # a helper that crashed won't answer, leave it out
+        helpers = [(process, tasks) for process, tasks in zip(self.processes, self.tasks) if process.is_alive()]
+        self.processes = [process for process, _ in helpers]
+        self.tasks = [tasks for _, tasks in helpers]
+        for tasks in self.tasks:
+            tasks.put((root_fen, moves, self.engine.ttable.age))
+        self.searching = True
+
+    def stop_search(self):
+        # returns the helpers' results as (move, score, depth, nodes)
+        if not self.searching:
+            return []
+        self.stop_event.set()
+        results = []
+        while len(results) < len(self.processes):
+            try:
+                helper_id, move, score, depth, nodes = self.results.get(timeout=RESULT_POLL)
+            except queue.Empty:
+                # helpers that died can't answer, stop once every live one has
+                if len(results) >= sum(process.is_alive() for process in self.processes):
+                    break
+                continue
+            results.append((chess.Move.from_uci(move) if move else None, score, depth, nodes))
+        self.searching = False
+        return results
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.stop_search()
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        self.tasks = []
+
+        # hand the main engine a private table again before the shared block goes away
+        ttable = self.engine.ttable
+        self.engine.ttable = TranspositionTable(ttable.size_mb)
+        ttable.release()
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        atexit.unregister(self.close)
@@ -1,35 +1,154 @@
 import chess
-from chess.polyglot import zobrist_hash
+from array import array
+from engine.options import DEFAULT_TT_SIZE_MB, MIN_TT_SIZE_MB, MAX_TT_SIZE_MB
+
+# entry flags
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+ENTRY_BYTES = 16  # 8 byte key + 8 byte packed data
+BUCKET_SIZE = 2  # slot 0 is depth-preferred, slot 1 is always-replace
+SCORE_OFFSET = 1 << 31
+AGE_MASK = 0x3F
+HASHFULL_SAMPLE = 1000
+
+# packed data layout (64 bits):
+#  0-15  move (from | to << 6 | promotion << 12), 0 = no move
+# 16-23  depth
+# 24-25  flag
+# 26-31  age (search generation that wrote the entry)
+# 32-63  score + SCORE_OFFSET
+#
+# the key column holds key ^ data so an entry torn by a concurrent write from another
+# process (shared table, see engine/smp.py) fails the key check instead of being trusted
+
+
+def pack_move(move):
+    if move is None:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def unpack_move(packed):
+    if packed == 0:
+        return None
+    promotion = (packed >> 12) & 0x7
+    return chess.Move(packed & 0x3F, (packed >> 6) & 0x3F, promotion or None)
+
+
+def table_bytes(size_mb):
+    return TranspositionTable._bucket_count(size_mb) * BUCKET_SIZE * ENTRY_BYTES
+
 
 class TranspositionTable:
-    def __init__(self):
-        self.table = {}
-
-    def check_pos_in_table(self, board: chess.Board, depth, alpha, beta):
-        key = zobrist_hash(board)
-        entry = self.table.get(key)
-        if entry is None:
-            return None
-
-        if entry["depth"] >= depth:
-            score, flag, bestmove = entry["score"], entry["flag"], entry["bestmove"]
-            #loc_alpha, loc_beta = alpha, beta
-            if flag == "EXACT":
-                return entry
-            elif flag == "LOWER" and score > alpha:
+    def __init__(self, size_mb: int = DEFAULT_TT_SIZE_MB, buffer=None, attach=False):
+        self.size_mb = size_mb
+        self.buckets = self._bucket_count(size_mb)
+        self.mask = self.buckets - 1
+        # optional writable buffer (e.g. shared memory) of at least table_bytes(size_mb) to hold the entries
+        self.buffer = buffer
+        self._view = None
+        self.keys = None
+        self.data = None
+        self.age = 0
+        if attach and buffer is not None:
+            # another process already cleared the buffer and may be filling it, keep its entries
+            self._map_buffer()
+        else:
+            self.clear()
+
+    @staticmethod
+    def _bucket_count(size_mb):
+        # largest power of two number of buckets that fits the budget
+        max_buckets = max(1, (size_mb * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SIZE))
+        return 1 << (max_buckets.bit_length() - 1)
+
+    def _map_buffer(self):
+        entries = self.buckets * BUCKET_SIZE
+        self._view = memoryview(self.buffer)[:ENTRY_BYTES * entries]
+        self.keys = self._view[:8 * entries].cast("Q")
+        self.data = self._view[8 * entries:].cast("Q")
+
+    def clear(self):
+        entries = self.buckets * BUCKET_SIZE
+        if self.buffer is None:
+            self.keys = array("Q", bytes(8 * entries))
+            self.data = array("Q", bytes(8 * entries))
+        else:
+            if self._view is None:
+                self._map_buffer()
+            self._view[:] = bytes(len(self._view))
+        self.age = 0
+
+    def release(self):
+        # drop the views on an external buffer so it can be closed
+        if self._view is not None:
+            self.keys.release()
+            self.data.release()
+            self._view.release()
+            self._view = None
+        self.keys = self.data = None
+
+    def resize(self, size_mb):
+        if self.buffer is not None:
+            raise ValueError("a table on an external buffer can't be resized")
+        size_mb = min(max(size_mb, MIN_TT_SIZE_MB), MAX_TT_SIZE_MB)
+        self.size_mb = size_mb
+        self.buckets = self._bucket_count(size_mb)
+        self.mask = self.buckets - 1
+        self.clear()
+
+    def new_search(self):
+        # entries from older searches become the first candidates for replacement
+        self.age = (self.age + 1) & AGE_MASK
+
+    def check_pos_in_table(self, key, depth, alpha, beta):
+        index = (key & self.mask) << 1
+        keys, table = self.keys, self.data
+        data = table[index]
+        if keys[index] ^ data != key:
+            data = table[index + 1]
+            if keys[index + 1] ^ data != key:
+                return None
+
+        # (score, bestmove) where score is None when the entry can't cut this node,
+        # the move is still useful for ordering
+        bestmove = unpack_move(data & 0xFFFF)
+        if (data >> 16) & 0xFF >= depth:
+            score = (data >> 32) - SCORE_OFFSET
+            flag = (data >> 24) & 0x3
+            if flag == EXACT:
+                return score, bestmove
+            elif flag == LOWER and score > alpha:
                 alpha = score
-            elif flag == "UPPER" and score < beta:
+            elif flag == UPPER and score < beta:
                 beta = score
             if alpha >= beta:
-                return entry
+                return score, bestmove
 
-        return 0
+        return None, bestmove
+
+    def store(self, key, depth, score, flag, bestmove):
+        index = (key & self.mask) << 1
+        data = (pack_move(bestmove) | (min(max(depth, 0), 0xFF) << 16) | (flag << 24) | (self.age << 26)
+                | ((score + SCORE_OFFSET) << 32))
+
+        # depth-preferred slot keeps the deepest result of the current search,
+        # everything else goes to the always-replace slot
+        keys, table = self.keys, self.data
+        old_data = table[index]
+        if (old_data != 0 and keys[index] ^ old_data != key and (old_data >> 26) & AGE_MASK == self.age
+                and depth < (old_data >> 16) & 0xFF):
+            index += 1
+
+        # an empty slot is all zero, a stored entry always has a non-zero score field
+        keys[index] = key ^ data
+        table[index] = data
 
-    def store(self, board: chess.Board, depth, score, flag, bestmove):
-        key = zobrist_hash(board)
-        self.table[key] = {
-            "depth": depth,
-            "score": score,
-            "flag": flag,
-            "bestmove": bestmove
-        }
+    def hashfull(self):
+        # permille of the sampled entries written by the current search, as reported by UCI
+        sample = min(HASHFULL_SAMPLE, len(self.keys))
+        data, age = self.data, self.age
+        filled = sum(1 for i in range(sample) if data[i] != 0 and (data[i] >> 26) & AGE_MASK == age)
+        return filled * 1000 // sample
@@ -1,4 +1,5 @@
 from uci.uci import UCI
+import multiprocessing
 import sys
 
 def main():
@@ -12,5 +13,6 @@ def main():
         print("Exiting ChessEngine1 UCI")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # lazy smp helpers in the frozen build
     #print("Engine starting...")
     main()
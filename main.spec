@@ -5,7 +5,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('resources/opening_book.txt', 'resources')],
+    datas=[('resources/opening_book.bin', 'resources')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,172 @@
+from engine.analysis import analyze_many
+import chess
+import argparse
+import json
+import os
+import sys
+
+resources_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../resources")
+puzzle_paths = [os.path.join(resources_dir, name)
+                for name in ("eigenmann_rapid.epd", "wacnew_arasan.epd", "iq4_arasan.epd")]
+
+MOVETIME = 3000
+NPS_REGRESSION = 0.05  # diff flags a suite whose nps drops by more than this fraction
+
+def parse_epd_line(line):
+    # fen fields and the bm/am/id operations, tolerates "bm Qd2, Bc2" style move lists
+    fields = line.split(maxsplit=4)
+    if len(fields) < 5:
+        return None
+    board = chess.Board(" ".join(fields[:4]) + " 0 1")
+    operations = {}
+    for operation in fields[4].split(";"):
+        opcode, _, operand = operation.strip().partition(" ")
+        if opcode:
+            operations[opcode] = operand.strip().strip('"')
+    if "bm" not in operations and "am" not in operations:
+        return None
+    best_moves = [board.parse_san(san).uci() for san in operations.get("bm", "").replace(",", " ").split()]
+    avoid_moves = [board.parse_san(san).uci() for san in operations.get("am", "").replace(",", " ").split()]
+    return board.fen(), best_moves, avoid_moves, operations.get("id", "")
+
+
+def load_suite(path):
+    positions = []
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                parsed = parse_epd_line(line.strip())
+                if parsed is not None:
+                    positions.append(parsed)
+    return positions
+
+
+def is_solved(move, best_moves, avoid_moves):
+    if move is None:
+        return False
+    if best_moves and move not in best_moves:
+        return False
+    return move not in avoid_moves
+
+
+def score_position(task, result):
+    suite, index, fen, best_moves, avoid_moves, epd_id = task
+    solved = is_solved(result.best_move, best_moves, avoid_moves)
+
+    # time to solution: the first iteration from which every iteration kept a correct move
+    solve_time = solve_depth = None
+    if solved:
+        solve_time, solve_depth = result.time, result.depth
+        for iteration_time, iteration_depth, iteration_move in reversed(result.iterations):
+            if not is_solved(iteration_move, best_moves, avoid_moves):
+                break
+            solve_time, solve_depth = iteration_time, iteration_depth
+
+    return {"suite": suite, "index": index, "id": epd_id, "fen": fen, "bm": best_moves, "am": avoid_moves,
+            "move": result.best_move, "solved": solved, "score": result.score, "depth": result.depth,
+            "nodes": result.nodes, "nps": int(result.nodes / result.time) if result.time > 0 else 0,
+            "time": result.time, "solve_time": solve_time, "solve_depth": solve_depth}
+
+
+def summarize(positions):
+    suites = {}
+    for position in positions:
+        suite = suites.setdefault(position["suite"], {"solved": 0, "total": 0, "nodes": 0, "time": 0.0})
+        suite["solved"] += position["solved"]
+        suite["total"] += 1
+        suite["nodes"] += position["nodes"]
+        suite["time"] += position["time"]
+    for suite in suites.values():
+        suite["nps"] = int(suite["nodes"] / suite["time"]) if suite["time"] > 0 else 0
+    return suites
+
+
+def run_suites(paths, report_path, movetime=MOVETIME, depth=None, workers=None, engine_options=None):
+    # finished positions are appended to <report>.partial.jsonl so an interrupted run resumes where it stopped
+    engine_options = engine_options or {}
+    partial_path = report_path + ".partial.jsonl"
+    positions = []
+    if os.path.exists(partial_path):
+        with open(partial_path) as partial_file:
+            positions = [json.loads(line) for line in partial_file if line.strip()]
+    finished = {(position["suite"], position["index"]) for position in positions}
+
+    tasks = []
+    for path in paths:
+        suite = os.path.basename(path)
+        for index, (fen, best_moves, avoid_moves, epd_id) in enumerate(load_suite(path)):
+            if (suite, index) not in finished:
+                tasks.append((suite, index, fen, best_moves, avoid_moves, epd_id))
+    if finished:
+        print(f"Resuming: {len(finished)} positions already done, {len(tasks)} left")
+
+    # tables are cleared between positions so a result doesn't depend on which worker got it
+    with open(partial_path, "a") as partial_file:
+        results = analyze_many([task[2] for task in tasks], depth, movetime, workers, engine_options=engine_options,
+                               record_iterations=True, clear_tables=True)
+        for result in results:
+            position = score_position(tasks[result.index], result)
+            positions.append(position)
+            partial_file.write(json.dumps(position) + "\n")
+            partial_file.flush()
+            print(f"{position['suite']} {position['id']}: {position['move']} "
+                  f"{'correct' if position['solved'] else 'wrong'} depth {position['depth']} "
+                  f"nodes {position['nodes']} nps {position['nps']} time {position['time']:.2f}")
+
+    positions.sort(key=lambda position: (position["suite"], position["index"]))
+    report = {"settings": {"movetime": movetime, "depth": depth, "engine": engine_options},
+              "suites": summarize(positions), "positions": positions}
+    with open(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    os.remove(partial_path)
+    return report
+
+
+def diff_reports(old_path, new_path, nps_regression=NPS_REGRESSION):
+    # prints solve rate and speed changes per suite and the positions that flipped, returns True on a regression
+    with open(old_path) as old_file, open(new_path) as new_file:
+        old, new = json.load(old_file), json.load(new_file)
+
+    regression = False
+    for suite, new_stats in new["suites"].items():
+        old_stats = old["suites"].get(suite)
+        if old_stats is None:
+            print(f"{suite}: only in {new_path}")
+            continue
+        nps_change = (new_stats["nps"] - old_stats["nps"]) / old_stats["nps"] if old_stats["nps"] else 0.0
+        print(f"{suite}: solved {old_stats['solved']}/{old_stats['total']} -> {new_stats['solved']}/"
+              f"{new_stats['total']}, nps {old_stats['nps']} -> {new_stats['nps']} ({nps_change:+.1%}), "
+              f"time {old_stats['time']:.1f}s -> {new_stats['time']:.1f}s")
+        if new_stats["solved"] < old_stats["solved"] or nps_change < -nps_regression:
+            regression = True
+
+    old_positions = {(position["suite"], position["index"]): position for position in old["positions"]}
+    for position in new["positions"]:
+        old_position = old_positions.get((position["suite"], position["index"]))
+        if old_position is None or old_position["solved"] == position["solved"]:
+            continue
+        change = "now solved" if position["solved"] else "no longer solved"
+        print(f"  {position['suite']} {position['id']}: {change} ({old_position['move']} -> {position['move']})")
+
+    print("REGRESSION" if regression else "no regression")
+    return regression
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run epd test suites in parallel and write a json report")
+    parser.add_argument("suites", nargs="*", default=puzzle_paths)
+    parser.add_argument("--movetime", type=int, default=MOVETIME, help="time per position in ms")
+    parser.add_argument("--depth", type=int, default=None, help="fixed depth instead of movetime")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--engine", default="{}", help="MinimaxEngine keyword arguments as json")
+    parser.add_argument("--report", default="epd_report.json")
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"), help="compare two reports instead of running")
+    args = parser.parse_args()
+
+    if args.diff:
+        sys.exit(1 if diff_reports(*args.diff) else 0)
+
+    report = run_suites(args.suites, args.report, None if args.depth else args.movetime, args.depth, args.workers,
+                        json.loads(args.engine))
+    for suite, stats in report["suites"].items():
+        print(f"{suite}: solved {stats['solved']}/{stats['total']} nps {stats['nps']} time {stats['time']:.1f}s")
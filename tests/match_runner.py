@@ -0,0 +1,179 @@
+from engine.minimax import MinimaxEngine
+from board.board import ChessBoard
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import chess
+import chess.pgn
+import argparse
+import json
+import math
+import os
+import time
+
+fen_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../resources/match_fens.txt")
+
+MAX_PLIES = 400  # games still running after this are adjudicated as draws
+
+
+def play_game(game_id, fen, white_options, black_options, white_tl, black_tl):
+    # runs in a worker process, every game gets its own board and engines
+    board = ChessBoard()
+    board.set_fen(fen)
+    engines = {
+        chess.WHITE: MinimaxEngine(board, **white_options),
+        chess.BLACK: MinimaxEngine(board, **black_options),
+    }
+    engines[chess.WHITE].time_limit = white_tl / 1000
+    engines[chess.BLACK].time_limit = black_tl / 1000
+
+    termination = None
+    while not board.board.is_game_over(claim_draw=True):
+        if len(board.board.move_stack) >= MAX_PLIES:
+            termination = "adjudication"
+            break
+        move = engines[board.board.turn].make_move()
+        if move is None or not board.is_legal(move):
+            # an engine that can't produce a legal move loses
+            termination = "illegal move"
+            break
+        board.push(move)
+
+    if termination == "adjudication":
+        result = "1/2-1/2"
+    elif termination == "illegal move":
+        result = "0-1" if board.board.turn else "1-0"
+    else:
+        result = board.board.result(claim_draw=True)
+    return game_id, fen, result, termination, [move.uci() for move in board.board.move_stack]
+
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def match_stats(wins, losses, draws):
+    # score, variance of a single game's result, Elo and the 95% interval
+    games = wins + losses + draws
+    score = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    error = 1.96 * math.sqrt(variance / games)
+    return score, variance, elo_from_score(score), elo_from_score(score - error), elo_from_score(score + error)
+
+
+def sprt_llr(wins, losses, draws, elo0, elo1):
+    # log likelihood ratio of H1 (elo1) against H0 (elo0), normal approximation of the game results
+    games = wins + losses + draws
+    if games == 0:
+        return 0.0
+    # half a game added to each outcome keeps the variance positive for one-sided results like +20 =10 -0
+    score, variance, _, _, _ = match_stats(wins + 0.5, losses + 0.5, draws + 0.5)
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / games)
+
+
+def load_openings(path, limit=None):
+    with open(path) as file:
+        fens = [line.strip() for line in file if line.strip()]
+    return fens[:limit] if limit else fens
+
+
+def write_pgn(pgn_file, game_id, fen, result, termination, moves, white_name, black_name):
+    board = chess.Board(fen)
+    for move in moves:
+        board.push(chess.Move.from_uci(move))
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "ChessEngine1 match"
+    game.headers["Round"] = str(game_id + 1)
+    game.headers["White"] = white_name
+    game.headers["Black"] = black_name
+    game.headers["Result"] = result
+    if termination:
+        game.headers["Termination"] = termination
+    print(game, file=pgn_file, end="\n\n", flush=True)
+
+
+def run_match(engine1_options, engine2_options, engine1_tl, engine2_tl, openings, workers, output_dir,
+              elo0=0.0, elo1=5.0, alpha=0.05, beta=0.05):
+    # every opening is played twice with colors swapped, results are from engine1's point of view
+    os.makedirs(output_dir, exist_ok=True)
+    lower_bound = math.log(beta / (1 - alpha))
+    upper_bound = math.log((1 - beta) / alpha)
+    wins = losses = draws = 0
+    verdict = None
+    start_time = time.time()
+
+    with open(os.path.join(output_dir, "games.pgn"), "w") as pgn_file, \
+            open(os.path.join(output_dir, "results.jsonl"), "w") as results_file, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for game_id in range(2 * len(openings)):
+            fen = openings[game_id // 2]
+            engine1_white = game_id % 2 == 0
+            if engine1_white:
+                args = (engine1_options, engine2_options, engine1_tl, engine2_tl)
+            else:
+                args = (engine2_options, engine1_options, engine2_tl, engine1_tl)
+            futures[pool.submit(play_game, game_id, fen, *args)] = engine1_white
+
+        total = len(futures)
+        for finished, future in enumerate(as_completed(futures), start=1):
+            game_id, fen, result, termination, moves = future.result()
+            engine1_white = futures[future]
+            if result == "1/2-1/2":
+                draws += 1
+            elif (result == "1-0") == engine1_white:
+                wins += 1
+            else:
+                losses += 1
+
+            white_name, black_name = ("engine1", "engine2") if engine1_white else ("engine2", "engine1")
+            write_pgn(pgn_file, game_id, fen, result, termination, moves, white_name, black_name)
+            results_file.write(json.dumps({"game": game_id + 1, "fen": fen, "white": white_name, "black": black_name,
+                                           "result": result, "termination": termination,
+                                           "plies": len(moves)}) + "\n")
+            results_file.flush()
+
+            _, _, elo, elo_low, elo_high = match_stats(wins, losses, draws)
+            llr = sprt_llr(wins, losses, draws, elo0, elo1)
+            print(f"Game {finished}/{total}: {white_name} vs {black_name} {result} | "
+                  f"+{wins} -{losses} ={draws} | Elo {elo:.1f} [{elo_low:.1f}, {elo_high:.1f}] | "
+                  f"LLR {llr:.2f} [{lower_bound:.2f}, {upper_bound:.2f}]")
+
+            if llr >= upper_bound:
+                verdict = "H1 accepted"
+            elif llr <= lower_bound:
+                verdict = "H0 accepted"
+            if verdict:
+                for pending in futures:
+                    pending.cancel()
+                break
+
+    _, _, elo, elo_low, elo_high = match_stats(wins, losses, draws) if wins + losses + draws else (0, 0, 0, 0, 0)
+    summary = {"engine1": wins, "engine2": losses, "draw": draws, "elo": elo, "elo_low": elo_low,
+               "elo_high": elo_high, "sprt": verdict, "time": time.time() - start_time}
+    with open(os.path.join(output_dir, "summary.json"), "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Play engine1 against engine2 over a set of openings in parallel")
+    parser.add_argument("--engine1", default="{}", help="MinimaxEngine keyword arguments as json")
+    parser.add_argument("--engine2", default="{}", help="MinimaxEngine keyword arguments as json")
+    parser.add_argument("--tc1", type=int, default=1000, help="engine1 time per move in ms")
+    parser.add_argument("--tc2", type=int, default=1000, help="engine2 time per move in ms")
+    parser.add_argument("--openings", default=fen_path, help="file with one fen per line")
+    parser.add_argument("--games", type=int, default=None, help="number of openings to use (2 games each)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="match_output")
+    parser.add_argument("--elo0", type=float, default=0.0)
+    parser.add_argument("--elo1", type=float, default=5.0)
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    args = parser.parse_args()
+
+    results = run_match(json.loads(args.engine1), json.loads(args.engine2), args.tc1, args.tc2,
+                        load_openings(args.openings, args.games), args.workers, args.output,
+                        args.elo0, args.elo1, args.alpha, args.beta)
+    print(results)
@@ -0,0 +1,61 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../main.py")
+
+TARGET_MS = 100  # cold start budget for "uciok"
+RUNS = 10
+
+
+def wait_for(process, token):
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"engine exited before '{token}'")
+        if line.startswith(token):
+            return time.perf_counter()
+
+
+def measure_startup(command):
+    # ms from launching the engine to uciok, readyok and the first bestmove
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+    try:
+        process.stdin.write("uci\n")
+        process.stdin.flush()
+        uciok = wait_for(process, "uciok")
+        process.stdin.write("isready\n")
+        process.stdin.flush()
+        readyok = wait_for(process, "readyok")
+        process.stdin.write("position fen 8/8/8/4k3/8/8/3QK3/8 w - - 0 1\ngo depth 1\n")
+        process.stdin.flush()
+        bestmove = wait_for(process, "bestmove")
+        process.stdin.write("quit\n")
+        process.stdin.flush()
+        process.wait(timeout=10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return (uciok - start) * 1000, (readyok - start) * 1000, (bestmove - start) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure cold start time of the uci engine")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--target", type=float, default=TARGET_MS, help="maximum median ms to uciok")
+    parser.add_argument("--command", nargs="+", default=[sys.executable, main_path])
+    args = parser.parse_args()
+
+    results = [measure_startup(args.command) for _ in range(args.runs)]
+    for name, values in zip(("uciok", "readyok", "first bestmove"), zip(*results)):
+        print(f"{name}: median {statistics.median(values):.1f} ms, min {min(values):.1f} ms, max {max(values):.1f} ms")
+
+    median_uciok = statistics.median(result[0] for result in results)
+    if median_uciok > args.target:
+        print(f"FAIL: uciok median {median_uciok:.1f} ms over the {args.target:.0f} ms target")
+        sys.exit(1)
+    print(f"OK: uciok median {median_uciok:.1f} ms within the {args.target:.0f} ms target")
@@ -0,0 +1,88 @@
+import random
+import chess
+from chess.polyglot import zobrist_hash
+from board.board import ChessBoard
+from engine.piece_maps import PST, PHASE_WEIGHTS, ENDGAME, MIDDLEGAME, pst_index
+from engine.repetition import RepetitionTable
+
+
+def full_eval(board):
+    mg = eg = phase = 0
+    for square, piece in board.piece_map().items():
+        mg += PST[pst_index(MIDDLEGAME, piece.color, piece.piece_type, square)]
+        eg += PST[pst_index(ENDGAME, piece.color, piece.piece_type, square)]
+        phase += PHASE_WEIGHTS[piece.piece_type]
+    return mg, eg, phase
+
+
+def test_incremental_hash_and_eval_match_full_computation():
+    rng = random.Random(1)
+    board = ChessBoard()
+    for _ in range(30):
+        board.reset()
+        for _ in range(150):
+            moves = list(board.board.legal_moves)
+            if not moves:
+                break
+            if rng.random() < 0.05 and not board.board.is_check():
+                board.push(chess.Move.null())
+            else:
+                board.push(rng.choice(moves))
+            assert board.hash == zobrist_hash(board.board)
+            assert (board.mg_eval, board.eg_eval, board.phase) == full_eval(board.board)
+        while board.board.move_stack:
+            board.pop()
+            assert board.hash == zobrist_hash(board.board)
+        assert (board.mg_eval, board.eg_eval, board.phase) == full_eval(board.board)
+
+
+def test_hash_history_with_halfmove_clock_from_fen():
+    # the fen's halfmove clock counts plies that are not on the stack
+    board = ChessBoard()
+    board.set_fen("4k3/8/8/8/8/8/8/R3K3 w - - 2 10")
+    for move in ["a1a2", "e8d8", "a2a1", "d8e8", "a1a2", "e8d8", "a2a1"]:
+        assert board.uci_move(move)
+    assert board.board.halfmove_clock == 9
+    assert board.hash_history(board.board.halfmove_clock) == board.hash_history()
+    assert len(board.hash_history(3)) == 3
+
+
+def test_repetition_table_sees_threefold_against_game_history():
+    board = ChessBoard()
+    board.set_fen("4k3/8/8/8/8/8/8/R3K3 w - - 2 10")
+    for move in ["a1a2", "e8d8", "a2a1", "d8e8", "a1a2", "e8d8", "a2a1"]:
+        board.uci_move(move)
+    table = RepetitionTable()
+    table.seed(board.hash_history(board.board.halfmove_clock), board.hash)
+
+    board.push(chess.Move.from_uci("d8e8"))
+    table.push(board.hash)
+    assert board.board.is_repetition(3)
+    assert table.is_repetition(board.hash, board.board.halfmove_clock)
+
+
+def test_repetition_inside_search_is_a_draw_but_before_root_needs_threefold():
+    board = ChessBoard()
+    board.set_fen("4k3/8/8/8/8/8/8/R3K3 w - - 0 1")
+    board.uci_move("a1a2")
+    board.uci_move("e8d8")
+    table = RepetitionTable()
+    table.seed(board.hash_history(board.board.halfmove_clock), board.hash)
+
+    # back to the start position, seen once before the root
+    for move in ["a2a1", "d8e8"]:
+        board.push(chess.Move.from_uci(move))
+        table.push(board.hash)
+    assert not table.is_repetition(board.hash, board.board.halfmove_clock)
+
+    # back to the root position inside the search line
+    for move in ["a1a2", "e8d8"]:
+        board.push(chess.Move.from_uci(move))
+        table.push(board.hash)
+    assert not table.is_repetition(board.hash, board.board.halfmove_clock)
+
+    # the start position again, its last occurrence is inside the search line
+    for move in ["a2a1", "d8e8"]:
+        board.push(chess.Move.from_uci(move))
+        table.push(board.hash)
+    assert table.is_repetition(board.hash, board.board.halfmove_clock)
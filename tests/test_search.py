@@ -0,0 +1,14 @@
+from board.board import ChessBoard
+from engine.minimax import MinimaxEngine
+
+
+def test_pv_survives_a_search_of_a_position_already_in_the_table():
+    board = ChessBoard()
+    board.set_fen("r1b2rk1/pp1nqppp/2p1pn2/3p4/2PP4/2NBPN2/PPQ2PPP/R4RK1 w - - 0 10")
+    engine = MinimaxEngine(board, depth=4)
+    engine.opening = False
+    engine.make_move()
+    first_pv = list(engine.pv)
+    engine.make_move()
+    assert len(first_pv) == 4
+    assert len(engine.pv) == len(first_pv)
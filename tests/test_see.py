@@ -0,0 +1,38 @@
+import chess
+from engine.piece_maps import Piece_values
+from engine.see import static_exchange_evaluation
+
+
+def see(fen, move):
+    board = chess.Board(fen)
+    move = chess.Move.from_uci(move)
+    assert board.is_legal(move)
+    return static_exchange_evaluation(board, move, Piece_values)
+
+
+def test_undefended_pawn():
+    assert see("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5") == 100
+
+
+def test_knight_takes_pawn_defended_twice():
+    # Nxe5 Nxe5 and white stops, going on with Rxe5 (queen behind it) only loses more to Bxe5 (queen behind it)
+    assert see("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5") == -200
+
+
+def test_en_passant():
+    assert see("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6") == 100
+    # cxd6 wins the pawn back
+    assert see("4k3/2p5/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6") == 0
+
+
+def test_x_ray_recapture():
+    # the rook behind the first attacker recaptures once the first one has left the file
+    assert see("3r2k1/8/8/3p4/8/8/3R4/3R2K1 w - - 0 1", "d2d5") == 100
+    assert see("3r2k1/8/8/3p4/8/8/3R4/6K1 w - - 0 1", "d2d5") == -400
+    assert see("3r2k1/3r4/8/3p4/8/8/3R4/3R2K1 w - - 0 1", "d2d5") == -400
+
+
+def test_promotion():
+    assert see("8/3P4/8/8/8/8/k7/4K3 w - - 0 1", "d7d8q") == 800
+    # the new queen is taken, only the pawn is lost
+    assert see("2r5/3P4/8/8/8/8/k7/4K3 w - - 0 1", "d7d8q") == -100
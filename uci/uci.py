@@ -1,13 +1,19 @@
-from board.board import ChessBoard
-from engine.minimax import MinimaxEngine
-from engine.random import RandomEngine
+from engine.options import (DEFAULT_TT_SIZE_MB, MIN_TT_SIZE_MB, MAX_TT_SIZE_MB, DEFAULT_THREADS, MIN_THREADS, MAX_THREADS,
+                            DEFAULT_ROOT_SPLIT, MIN_ROOT_SPLIT, MAX_ROOT_SPLIT)
 import time
 import threading
 
 class UCI:
     def __init__(self, engine_type=0):
-        self.board = ChessBoard()
-        self.engine = MinimaxEngine(self.board, engine_type=engine_type)
+        # the board and engine (python-chess, tables) are built on a background thread
+        # so "uci" and "isready" are answered right away, commands that need them wait for it
+        self.engine_type = engine_type
+        self._board = None
+        self._engine = None
+        # set by "stop", cleared before every search so a stop that arrives before make_move starts isn't lost
+        self.stop_request = threading.Event()
+        self._init_thread = threading.Thread(target=self._initialize, daemon=True)
+        self._init_thread.start()
         #for the most recent move
         self.move_time = 0
         self.move = None
@@ -17,6 +23,38 @@ class UCI:
         self.positions_searched = 0
         self.print = True
         self.search_thread = None
+        # "go ponder" and "go infinite" hold their bestmove until "ponderhit" or "stop" releases it
+        self.pondering = False
+        self.ponder_time = None
+        self.bestmove_release = threading.Event()
+        self.bestmove_release.set()
+
+    def _initialize(self):
+        from board.board import ChessBoard
+        from engine.minimax import MinimaxEngine
+        board = ChessBoard()
+        engine = MinimaxEngine(board, engine_type=self.engine_type)
+        engine.info_callback = self._print_info
+        engine.stop_event = self.stop_request
+        # board first, _engine being set is what marks the start as finished
+        self._board = board
+        self._engine = engine
+
+    def _wait_for_engine(self):
+        # joining a finished thread is cheap, and it covers a start that is halfway through its assignments
+        self._init_thread.join()
+        if self._engine is None:  # background start failed, build it here so the error shows
+            self._initialize()
+
+    @property
+    def board(self):
+        self._wait_for_engine()
+        return self._board
+
+    @property
+    def engine(self):
+        self._wait_for_engine()
+        return self._engine
 
     def handle_command(self, line):
         #personal use
@@ -48,9 +86,15 @@ class UCI:
         if line == "uci":
             print("id name ChessEngine1")
             print("id author Pranav")
+            print(f"option name Hash type spin default {DEFAULT_TT_SIZE_MB} min {MIN_TT_SIZE_MB} max {MAX_TT_SIZE_MB}")
+            print(f"option name Threads type spin default {DEFAULT_THREADS} min {MIN_THREADS} max {MAX_THREADS}")
+            print(f"option name RootSplit type spin default {DEFAULT_ROOT_SPLIT} min {MIN_ROOT_SPLIT} max {MAX_ROOT_SPLIT}")
+            print("option name Ponder type check default false")
             print("uciok")
         elif line == "isready":
             print("readyok")
+        elif line.startswith("setoption"):
+            self.set_option(line)
         elif line.startswith("position"):
             self.set_position(line)
         elif line.startswith("go"):
@@ -60,10 +104,11 @@ class UCI:
             self.board.reset()
             self.engine.reset_engine()
         elif line == "stop":
-            if self.search_thread and self.search_thread.is_alive():
-                self.engine.stop_search = True  # signal search to stop
-                self.search_thread.join()
+            self.stop()
+        elif line == "ponderhit":
+            self.ponderhit()
         elif line == "quit":
+            self.stop()
             exit()
         else:
             pass
@@ -85,6 +130,30 @@ class UCI:
             for move in line_parts[moves_ind + 1:]:
                 self.board.uci_move(move)
 
+    def set_option(self, line):
+        line_parts = line.split()
+        if "name" not in line_parts:
+            return
+        value_ind = line_parts.index("value") if "value" in line_parts else len(line_parts)
+        name = " ".join(line_parts[line_parts.index("name") + 1: value_ind]).lower()
+        value = " ".join(line_parts[value_ind + 1:])
+
+        if name == "hash":
+            try:
+                self.engine.set_hash(int(value))
+            except ValueError:
+                pass
+        elif name == "threads":
+            try:
+                self.engine.set_threads(int(value))
+            except ValueError:
+                pass
+        elif name == "rootsplit":
+            try:
+                self.engine.set_root_split(int(value))
+            except ValueError:
+                pass
+
     def go(self):
         start_time = time.time()
         move = self.engine.make_move()
@@ -131,7 +200,22 @@ class UCI:
             self.engine.depth = depth
             #print(self.engine.depth)
 
+        # ponder: search the position after the expected reply with no limit, the clock starts at ponderhit
+        # infinite: search until stop
+        self.pondering = "ponder" in parts
+        self.ponder_time = time_limit if self.pondering else None
+        if self.pondering or "infinite" in parts:
+            from engine.minimax import MAX_DEPTH
+            time_limit = None
+            if depth is None:
+                self.engine.depth = MAX_DEPTH
+            self.bestmove_release.clear()
+        else:
+            self.bestmove_release.set()
+
         self.engine.time_limit=time_limit
+        self.engine.deadline = None
+        self.stop_request.clear()
 
         #thread move
         self.search_thread = threading.Thread(target=self._searchprint_move)
@@ -139,9 +223,29 @@ class UCI:
 
 
 
+    def stop(self):
+        if self.search_thread and self.search_thread.is_alive():
+            self.stop_request.set()  # signal search to stop
+            self.bestmove_release.set()
+            self.search_thread.join()
+
+    def ponderhit(self):
+        # the expected move was played: keep searching, now against our own clock measured from here
+        if not self.pondering:
+            return
+        self.pondering = False
+        if self.ponder_time is not None:
+            self.engine.deadline = time.time() + self.ponder_time
+        else:
+            # "go ponder" without a clock has nothing to budget against, answer with what was found so far
+            self.stop_request.set()
+        self.bestmove_release.set()
+
     def _searchprint_move(self):
         start_time = time.time()
         best_move = self.engine.make_move()
+        # a ponder or infinite search that ends on its own still waits for ponderhit/stop to answer
+        self.bestmove_release.wait()
         end_time = time.time()
         self.move_time = end_time - start_time
         self.positions_evaluated = self.engine.nodes_evaluated
@@ -150,21 +254,49 @@ class UCI:
         self.positions_searched = self.engine.nodes_searched
 
         if best_move:
+            # the reply we expect is the next move of the principal variation, pondered on next turn
+            pv = self.engine.pv
+            ponder_move = pv[1] if len(pv) > 1 and pv[0] == best_move else None
             self.board.push(best_move)
             self.move = best_move
+            if ponder_move is not None and not self.board.is_legal(ponder_move):
+                ponder_move = None
             if self.print:
-                print(f"bestmove {best_move.uci()}")
+                if ponder_move is not None:
+                    print(f"bestmove {best_move.uci()} ponder {ponder_move.uci()}")
+                else:
+                    print(f"bestmove {best_move.uci()}")
         else:
             self.move = None
             if self.print:
                 print("bestmove 0000")
 
+    def _print_info(self, info):
+        # engine reports: a completed iteration has a depth, score and pv, progress updates only counters
+        if not self.print:
+            return
+        elapsed = info["time"]
+        parts = ["info"]
+        if "depth" in info:
+            parts += ["depth", str(info["depth"])]
+            if info["mate"] is not None:
+                parts += ["score", "mate", str(info["mate"])]
+            else:
+                parts += ["score", "cp", str(info["score"])]
+        parts += ["nodes", str(info["nodes"]), "nps", str(int(info["nodes"] / elapsed) if elapsed > 0 else 0),
+                  "time", str(int(elapsed * 1000))]
+        if info["hashfull"] is not None:
+            parts += ["hashfull", str(info["hashfull"])]
+        if info.get("pv"):
+            parts += ["pv"] + [move.uci() for move in info["pv"]]
+        print(" ".join(parts), flush=True)
+
     def _decide_time(self, movetime, wtime, btime, winc, binc):
         if movetime:
             return movetime - 0.250
 
         total_time = wtime if self.board.board.turn else btime
-        increment = winc if self.board.board.turn else binc
+        increment = (winc if self.board.board.turn else binc) or 0
 
         if total_time is None:
             return None